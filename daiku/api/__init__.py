@@ -1,57 +1,99 @@
 from __future__ import annotations
 
+import contextlib
+import importlib.util
 import json
+import math
 import os
-from typing import Dict, List, Tuple
-
-try:  # optional dependency for real database
-    import boto3  # type: ignore
-except ModuleNotFoundError:  # pragma: no cover - fallback when boto3 unavailable
-    boto3 = None
-
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
 from starlette.applications import Starlette
-from starlette.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
 from starlette.exceptions import HTTPException
 from starlette.routing import Route
 
+from daiku.api.cache import SharedCache
+from daiku.api.feed import feed, part_changes, plane_changes
+from daiku.api.ingest import read_part, read_plane
+from daiku.api.jobs import cancel_job, get_job, get_job_result, shutdown_jobs, submit_job
+from daiku.api.writer import WriteBehindBuffer
 from daiku.geo.base import V2D, V3D
 from daiku.geo.point import Point
+from daiku.geo.shape import packed_shape_hash, shape_hash, unpack_shape
 from daiku.parts import Part, Plane
+from daiku.parts.index import ShapeIndex
 
 # In-memory fallback stores -------------------------------------------------
 planes_mem: Dict[str, Plane] = {}
 parts_mem: Dict[str, Part] = {}
 part_planes_mem: Dict[str, Dict[str, Plane]] = {}
+# Content-addressed shape storage: every unique shape is kept once, keyed by
+# its hash, and planes share the stored list.
+shapes_mem: Dict[str, List[V2D]] = {}
+shape_refs_mem: Dict[str, int] = {}
 
 # DynamoDB helpers ---------------------------------------------------------
-if boto3 is not None:
+#
+# boto3 is optional and slow to import, so only its presence is checked here.
+# The module itself is imported the first time the DynamoDB backend is used,
+# normally from the lifespan hook before the first request arrives.
+USE_DYNAMODB = importlib.util.find_spec("boto3") is not None
+_tables_ready = False
+# boto3 resources and sessions are not thread-safe.  Handlers share one
+# resource, used from the event loop thread only; write-behind flushes run on
+# threadpool threads and, one at a time, use a second resource of their own.
+_local = threading.local()
+_flush_lock = threading.Lock()
+
+if USE_DYNAMODB:
     def dynamodb():
-        return boto3.resource(
+        resource = getattr(_local, "dynamodb", None)
+        return resource if resource is not None else _shared_resource()
+
+    @lru_cache(maxsize=None)
+    def _shared_resource():
+        return _new_resource()
+
+    @lru_cache(maxsize=None)
+    def _flush_resource():
+        return _new_resource()
+
+    def _new_resource():
+        import boto3  # type: ignore
+        from botocore.config import Config  # type: ignore
+
+        return boto3.session.Session().resource(
             "dynamodb",
             region_name=os.getenv("AWS_REGION", "us-east-1"),
             endpoint_url=os.getenv("DYNAMODB_ENDPOINT_URL"),
             aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID", "dummy"),
             aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY", "dummy"),
+            config=Config(max_pool_connections=int(os.getenv("DAIKU_DDB_POOL_SIZE", "10"))),
         )
 
     def ensure_tables() -> None:
+        global _tables_ready
+        if _tables_ready:
+            return
         ddb = dynamodb()
         client = ddb.meta.client
         existing = client.list_tables().get("TableNames", [])
-        if "planes" not in existing:
-            ddb.create_table(
-                TableName="planes",
-                KeySchema=[{"AttributeName": "gid", "KeyType": "HASH"}],
-                AttributeDefinitions=[{"AttributeName": "gid", "AttributeType": "S"}],
-                BillingMode="PAY_PER_REQUEST",
-            ).wait_until_exists()
-        if "parts" not in existing:
-            ddb.create_table(
-                TableName="parts",
-                KeySchema=[{"AttributeName": "gid", "KeyType": "HASH"}],
-                AttributeDefinitions=[{"AttributeName": "gid", "AttributeType": "S"}],
-                BillingMode="PAY_PER_REQUEST",
-            ).wait_until_exists()
+        for name in ("planes", "parts", "shapes"):
+            if name not in existing:
+                ddb.create_table(
+                    TableName=name,
+                    KeySchema=[{"AttributeName": "gid", "KeyType": "HASH"}],
+                    AttributeDefinitions=[{"AttributeName": "gid", "AttributeType": "S"}],
+                    BillingMode="PAY_PER_REQUEST",
+                ).wait_until_exists()
+        _tables_ready = True
 
     def planes_table():
         ensure_tables()
@@ -60,6 +102,10 @@ if boto3 is not None:
     def parts_table():
         ensure_tables()
         return dynamodb().Table("parts")
+
+    def shapes_table():
+        ensure_tables()
+        return dynamodb().Table("shapes")
 else:
     def ensure_tables() -> None:  # pragma: no cover - noop for memory backend
         pass
@@ -70,6 +116,9 @@ else:
     def parts_table():  # pragma: no cover
         raise RuntimeError("DynamoDB not available")
 
+    def shapes_table():  # pragma: no cover
+        raise RuntimeError("DynamoDB not available")
+
 
 # Converters ----------------------------------------------------------------
 
@@ -81,11 +130,20 @@ def _v3d(data: dict) -> V3D:
     return V3D(data["x"], data["y"], data.get("z", 0.0))
 
 
+def _shape(data) -> List[V2D]:
+    if isinstance(data, np.ndarray):
+        # Packed by the ingest parser; shapes that are already stored are
+        # shared instead of being unpacked again.
+        stored = shapes_mem.get(packed_shape_hash(data))
+        return stored if stored is not None else unpack_shape(data)
+    return [_v2d(p) for p in data]
+
+
 def _plane_from_dict(data: dict) -> Plane:
     o = data["origin"]
     origin = Point(o["gid"], o["x"], o["y"], o.get("z", 0.0))
     normal = _v3d(data["normal"])
-    shapes = [[_v2d(p) for p in shape] for shape in data.get("shapes", [])]
+    shapes = [_shape(shape) for shape in data.get("shapes", [])]
     return Plane(data["gid"], origin, normal, shapes=shapes)
 
 
@@ -131,43 +189,458 @@ def _part_to_dict(part: Part, planes: List[Plane]) -> dict:
     }
 
 
+# Shape storage ---------------------------------------------------------------
+#
+# Shapes are stored once per unique vertex sequence and planes refer to them
+# by hash.  Every stored plane holds one reference per shape; overwriting a
+# plane releases the references held by its previous version and a shape is
+# dropped once nothing refers to it any more.
+
+def _acquire_shapes_mem(plane: Plane) -> None:
+    interned = []
+    for shape in plane.shapes:
+        key = shape_hash(shape)
+        interned.append(shapes_mem.setdefault(key, shape))
+        shape_refs_mem[key] = shape_refs_mem.get(key, 0) + 1
+    plane.shapes = interned
+
+
+def _release_shapes_mem(plane: Plane) -> None:
+    for shape in plane.shapes:
+        key = shape_hash(shape)
+        refs = shape_refs_mem.get(key, 0) - 1
+        if refs > 0:
+            shape_refs_mem[key] = refs
+        else:
+            shape_refs_mem.pop(key, None)
+            shapes_mem.pop(key, None)
+
+
+def _store_plane_mem(store: Dict[str, Plane], plane: Plane) -> None:
+    old = store.get(plane.gid)
+    _acquire_shapes_mem(plane)
+    if old is not None:
+        _release_shapes_mem(old)
+    store[plane.gid] = plane
+
+
+def _table(name: str):
+    ensure_tables()
+    return dynamodb().Table(name)
+
+
+def _get_item_ddb(table_name: str, gid: str):
+    if write_buffer is not None:
+        item = write_buffer.get(table_name, gid)
+        if item is not None:
+            return item
+    return _table(table_name).get_item(Key={"gid": gid}).get("Item")
+
+
+def _put_item_ddb(table_name: str, item: dict) -> None:
+    if write_buffer is not None:
+        write_buffer.put(table_name, item)
+    else:
+        _table(table_name).put_item(Item=item)
+    _invalidate(table_name, item["gid"])
+
+
+# Unprocessed batch items are retried with capped, jittered exponential
+# backoff; after BATCH_RETRIES rounds the call fails.
+BATCH_RETRIES = int(os.getenv("DAIKU_DDB_BATCH_RETRIES", "8"))
+
+
+def _backoff(attempt: int) -> None:
+    if attempt > BATCH_RETRIES:
+        raise RuntimeError(f"DynamoDB left items unprocessed after {BATCH_RETRIES} retries")
+    time.sleep(random.uniform(0, min(0.05 * 2 ** attempt, 2.0)))
+
+
+def _batch_get_ddb(table_name: str, keys: Iterable[str]) -> List[dict]:
+    keys = sorted(set(keys))
+    items: List[dict] = []
+    ensure_tables()
+    ddb = dynamodb()
+    for i in range(0, len(keys), 100):
+        request = {table_name: {"Keys": [{"gid": k} for k in keys[i:i + 100]]}}
+        attempt = 0
+        while request:
+            if attempt:
+                _backoff(attempt)
+            resp = ddb.batch_get_item(RequestItems=request)
+            items.extend(resp.get("Responses", {}).get(table_name, []))
+            request = resp.get("UnprocessedKeys")
+            attempt += 1
+    return items
+
+
+def _batch_write_ddb(puts: List[Tuple[str, dict]], written: Optional[List[Tuple[str, str]]] = None) -> None:
+    """Put ``(table, item)`` pairs in batches of 25.
+
+    ``(table, gid)`` of every item known to be stored is appended to
+    ``written`` as soon as DynamoDB confirms it, so a caller can tell what
+    landed if a later batch fails.
+    """
+
+    ensure_tables()
+    ddb = dynamodb()
+    for i in range(0, len(puts), 25):
+        request: Dict[str, List[dict]] = {}
+        for table_name, item in puts[i:i + 25]:
+            request.setdefault(table_name, []).append({"PutRequest": {"Item": item}})
+        attempt = 0
+        while request:
+            if attempt:
+                _backoff(attempt)
+            sent = _request_keys(request)
+            resp = ddb.batch_write_item(RequestItems=request)
+            request = resp.get("UnprocessedItems")
+            if written is not None:
+                pending = _request_keys(request or {})
+                written.extend(key for key in sent if key not in pending)
+            attempt += 1
+
+
+def _request_keys(request: Dict[str, List[dict]]) -> List[Tuple[str, str]]:
+    return [
+        (table_name, put["PutRequest"]["Item"]["gid"])
+        for table_name, puts in request.items()
+        for put in puts
+    ]
+
+
+def _acquire_shapes_ddb(shapes: Dict[str, List[V2D]], counts: Counter) -> None:
+    st = shapes_table()
+    for key, count in counts.items():
+        st.update_item(
+            Key={"gid": key},
+            UpdateExpression="SET #d = if_not_exists(#d, :d) ADD refs :n",
+            ExpressionAttributeNames={"#d": "data"},
+            ExpressionAttributeValues={
+                ":d": json.dumps([[p.x, p.y] for p in shapes[key]]),
+                ":n": count,
+            },
+        )
+
+
+def _release_shapes_ddb(counts: Counter) -> None:
+    st = shapes_table()
+    conditional_failed = st.meta.client.exceptions.ConditionalCheckFailedException
+    for key, count in counts.items():
+        try:
+            resp = st.update_item(
+                Key={"gid": key},
+                UpdateExpression="ADD refs :n",
+                ConditionExpression="attribute_exists(gid)",
+                ExpressionAttributeValues={":n": -count},
+                ReturnValues="UPDATED_NEW",
+            )
+            if resp["Attributes"]["refs"] <= 0:
+                st.delete_item(
+                    Key={"gid": key},
+                    ConditionExpression="refs <= :zero",
+                    ExpressionAttributeValues={":zero": 0},
+                )
+        except conditional_failed:
+            # Already gone, or re-acquired by a concurrent writer.
+            pass
+
+
+def _shape_refs(record: dict) -> List[str]:
+    """Return the shape hashes referenced by a stored plane record."""
+
+    return [s for s in record.get("shapes", []) if isinstance(s, str)]
+
+
+def _put_plane_ddb(plane: Plane) -> None:
+    if write_buffer is not None:
+        # Buffered planes keep their vertices inline; hashing and reference
+        # counting happen once per flush in ``_flush_writes``.
+        write_buffer.put("planes", {"gid": plane.gid, "data": json.dumps(_plane_to_dict(plane))})
+        _invalidate("planes", plane.gid)
+        return
+    keys = [shape_hash(shape) for shape in plane.shapes]
+    _acquire_shapes_ddb(dict(zip(keys, plane.shapes)), Counter(keys))
+    record = _plane_to_dict(plane)
+    record["shapes"] = keys
+    resp = _table("planes").put_item(
+        Item={"gid": plane.gid, "data": json.dumps(record)},
+        ReturnValues="ALL_OLD",
+    )
+    _invalidate("planes", plane.gid)
+    old = resp.get("Attributes")
+    if old:
+        _release_shapes_ddb(Counter(_shape_refs(json.loads(old["data"]))))
+
+
+def _flush_writes(batch: Dict[str, Dict[str, dict]]) -> None:
+    """Persist a coalesced write-behind batch with the flush resource."""
+
+    with _flush_lock:
+        _local.dynamodb = _flush_resource()
+        try:
+            _write_batch(batch)
+        finally:
+            del _local.dynamodb
+
+
+def _write_batch(batch: Dict[str, Dict[str, dict]]) -> None:
+    """Persist a coalesced write-behind batch.
+
+    Shape references are adjusted by the net difference between the stored
+    and the new plane records, so repeated saves of unchanged geometry cost
+    no shape writes at all.  New references are taken before the planes are
+    written so a stored plane never points at a missing shape.  Afterwards,
+    whether or not every put succeeded, the counts are corrected to what
+    actually landed: references taken for planes that were not written are
+    given back, so a failed flush can be retried without inflating them.
+    """
+
+    shapes: Dict[str, List[V2D]] = {}
+    # Per plane: references its new record takes and its old record held.
+    gains: Dict[str, Counter] = {}
+    losses: Dict[str, Counter] = {}
+    puts: List[Tuple[str, dict]] = []
+    plane_items = batch.get("planes", {})
+    for old in _batch_get_ddb("planes", plane_items):
+        losses[old["gid"]] = Counter(_shape_refs(json.loads(old["data"])))
+    for gid, item in plane_items.items():
+        record = json.loads(item["data"])
+        keys = []
+        for shape in record.get("shapes", []):
+            if isinstance(shape, str):
+                keys.append(shape)
+                continue
+            vertices = [_v2d(p) for p in shape]
+            keys.append(shape_hash(vertices))
+            shapes[keys[-1]] = vertices
+        gains[gid] = Counter(keys)
+        record["shapes"] = keys
+        puts.append(("planes", {"gid": gid, "data": json.dumps(record)}))
+    for table_name, items in batch.items():
+        if table_name != "planes":
+            puts.extend((table_name, item) for item in items.values())
+
+    delta: Counter = Counter()
+    for gid in plane_items:
+        delta.update(gains[gid])
+        delta.subtract(losses.get(gid, Counter()))
+    acquired = +delta
+    _acquire_shapes_ddb(shapes, acquired)
+    written: List[Tuple[str, str]] = []
+    try:
+        _batch_write_ddb(puts, written)
+    finally:
+        landed = Counter()
+        for table_name, gid in written:
+            if table_name == "planes":
+                landed.update(gains[gid])
+                landed.subtract(losses.get(gid, Counter()))
+        landed.subtract(acquired)
+        # Other workers may have cached what the table held before.
+        for table_name, gid in written:
+            _invalidate(table_name, gid)
+        _acquire_shapes_ddb(shapes, +landed)
+        _release_shapes_ddb(-landed)
+
+
+def _resolve_shapes_ddb(records: List[dict]) -> List[dict]:
+    """Replace shape hashes in plane ``records`` with their vertex data.
+
+    Records written before shapes were content addressed, and planes still
+    waiting in the write-behind buffer, store the vertices inline; those are
+    passed through unchanged.
+    """
+
+    found = {
+        item["gid"]: [{"x": x, "y": y} for x, y in json.loads(item["data"])]
+        for item in _batch_get_ddb(
+            "shapes", (k for record in records for k in _shape_refs(record))
+        )
+    }
+    for record in records:
+        record["shapes"] = [
+            found.get(s, []) if isinstance(s, str) else s
+            for s in record.get("shapes", [])
+        ]
+    return records
+
+
+# Spatial indexes of stored planes keyed by their shape hashes, so hit tests
+# on unchanged DynamoDB planes skip both the shape reads and the rebuild.
+_index_cache: "OrderedDict[Tuple[str, ...], ShapeIndex]" = OrderedDict()
+INDEX_CACHE_SIZE = int(os.getenv("DAIKU_INDEX_CACHE_SIZE", "128"))
+
+
+def _plane_index_ddb(record: dict) -> ShapeIndex:
+    keys = tuple(_shape_refs(record))
+    if len(keys) != len(record.get("shapes", [])):
+        # Inline shapes (legacy or still buffered) are not content addressed.
+        return _plane_from_dict(_resolve_shapes_ddb([record])[0]).index
+    index = _index_cache.get(keys)
+    if index is None:
+        index = _plane_from_dict(_resolve_shapes_ddb([record])[0]).index
+        _index_cache[keys] = index
+        if len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    else:
+        _index_cache.move_to_end(keys)
+    return index
+
+
+# Shared read cache -----------------------------------------------------------
+#
+# Setting DAIKU_SHARED_CACHE to a file path, normally on /dev/shm, keeps
+# serialised plane payloads and part records in a cache shared by every
+# worker on the host (see ``daiku.api.cache``).  Each cached read takes a
+# stamp first so that a payload loaded while another worker was writing is
+# not stored, and every write invalidates its key after the table has been
+# updated.  Only the DynamoDB backend is cached: the memory backend is
+# private to each process, so there is nothing to share.
+#
+# The cache never grows past half of the free space on its filesystem.  In
+# Docker /dev/shm defaults to 64 MiB, so set ``shm_size`` on the container to
+# at least twice DAIKU_SHARED_CACHE_BYTES.
+SHARED_CACHE = os.getenv("DAIKU_SHARED_CACHE")
+
+
+@lru_cache(maxsize=None)
+def shared_cache() -> Optional[SharedCache]:
+    if not (USE_DYNAMODB and SHARED_CACHE):
+        return None
+    capacity = os.getenv("DAIKU_SHARED_CACHE_BYTES")
+    return SharedCache(SHARED_CACHE, int(capacity) if capacity else None)
+
+
+def _invalidate(table_name: str, gid: str) -> None:
+    cache = shared_cache()
+    if cache is not None:
+        cache.invalidate(f"{table_name}/{gid}")
+
+
+def _render(payload) -> bytes:
+    # Same encoding as ``JSONResponse``.
+    return json.dumps(
+        payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _buffered(table_name: str, gid: str) -> Optional[dict]:
+    return write_buffer.get(table_name, gid) if write_buffer is not None else None
+
+
+def _plane_bodies_ddb(plane_ids: List[str]) -> List[Optional[bytes]]:
+    """Serialised payloads of the given planes, ``None`` for missing ones.
+
+    Planes waiting in the write-behind buffer are served from it and never
+    cached, since the cache only reflects what the table holds.  Shapes of
+    all other planes missing from the shared cache are resolved in a single
+    batch.
+    """
+
+    cache = shared_cache()
+    buffered = [_buffered("planes", pid) for pid in plane_ids]
+    bodies: List[Optional[bytes]] = [
+        cache.get(f"planes/{pid}") if cache is not None and item is None else None
+        for pid, item in zip(plane_ids, buffered)
+    ]
+    missing = [i for i, body in enumerate(bodies) if body is None]
+    if not missing:
+        return bodies
+    stamps = [
+        cache.stamp(f"planes/{plane_ids[i]}") if cache is not None and buffered[i] is None else None
+        for i in missing
+    ]
+    loaded = []
+    for i, stamp in zip(missing, stamps):
+        item = buffered[i] or _get_item_ddb("planes", plane_ids[i])
+        if item is not None:
+            loaded.append((i, stamp, json.loads(item["data"])))
+    records = _resolve_shapes_ddb([record for _, _, record in loaded])
+    for (i, stamp, _), record in zip(loaded, records):
+        bodies[i] = _render(record)
+        if stamp is not None and _buffered("planes", plane_ids[i]) is None:
+            cache.put(f"planes/{plane_ids[i]}", bodies[i], stamp)
+    return bodies
+
+
+def _part_record_ddb(part_id: str) -> Optional[dict]:
+    item = _buffered("parts", part_id)
+    if item is not None:
+        return json.loads(item["data"])
+    cache = shared_cache()
+    data = cache.get(f"parts/{part_id}") if cache is not None else None
+    if data is None:
+        stamp = cache.stamp(f"parts/{part_id}") if cache is not None else None
+        item = _get_item_ddb("parts", part_id)
+        if item is None:
+            return None
+        data = item["data"].encode()
+        if cache is not None and _buffered("parts", part_id) is None:
+            cache.put(f"parts/{part_id}", data, stamp)
+    return json.loads(data)
+
+
+WRITE_BEHIND = USE_DYNAMODB and os.getenv("DAIKU_WRITE_BEHIND", "") not in ("", "0")
+write_buffer = (
+    WriteBehindBuffer(
+        _flush_writes,
+        interval=float(os.getenv("DAIKU_WRITE_BEHIND_INTERVAL", "0.25")),
+        max_items=int(os.getenv("DAIKU_WRITE_BEHIND_MAX_ITEMS", "25")),
+    )
+    if WRITE_BEHIND
+    else None
+)
+
+
 # API endpoints -------------------------------------------------------------
 
+def _version_header(topic: str) -> Dict[str, str]:
+    # Lets clients subscribe to the change feed from the state they just read.
+    return {"X-Change-Version": feed.token(feed.version(topic))}
+
+
 async def create_plane(request):
-    data = await request.json()
+    data = await read_plane(request)
     plane = _plane_from_dict(data)
-    if boto3 is None:
-        planes_mem[plane.gid] = plane
+    if not USE_DYNAMODB:
+        _store_plane_mem(planes_mem, plane)
     else:
-        planes_table().put_item(Item={"gid": plane.gid, "data": json.dumps(_plane_to_dict(plane))})
-    return JSONResponse(_plane_to_dict(plane))
+        _put_plane_ddb(plane)
+    plane_data = _plane_to_dict(plane)
+    feed.plane_saved(f"planes/{plane.gid}", plane, plane_data)
+    return JSONResponse(plane_data)
 
 
 async def get_plane(request):
     plane_id = request.path_params["plane_id"]
-    if boto3 is None:
+    if not USE_DYNAMODB:
         plane = planes_mem.get(plane_id)
         if plane is None:
             raise HTTPException(status_code=404, detail="Plane not found")
-        return JSONResponse(_plane_to_dict(plane))
-    resp = planes_table().get_item(Key={"gid": plane_id})
-    item = resp.get("Item")
-    if item is None:
+        return JSONResponse(_plane_to_dict(plane), headers=_version_header(f"planes/{plane_id}"))
+    body = _plane_bodies_ddb([plane_id])[0]
+    if body is None:
         raise HTTPException(status_code=404, detail="Plane not found")
-    return JSONResponse(json.loads(item["data"]))
+    return Response(body, media_type="application/json", headers=_version_header(f"planes/{plane_id}"))
 
 
 async def create_part(request):
-    data = await request.json()
+    data = await read_part(request)
     part, plane_list = _part_from_dict(data)
-    if boto3 is None:
+    if not USE_DYNAMODB:
+        old_planes = part_planes_mem.get(part.gid, {})
+        new_planes: Dict[str, Plane] = {}
+        for plane in plane_list:
+            _store_plane_mem(new_planes, plane)
+        for plane in old_planes.values():
+            _release_shapes_mem(plane)
         parts_mem[part.gid] = part
-        part_planes_mem[part.gid] = {p.gid: p for p in plane_list}
+        part_planes_mem[part.gid] = new_planes
     else:
         plane_ids = []
-        pt = planes_table()
         for plane in plane_list:
-            pt.put_item(Item={"gid": plane.gid, "data": json.dumps(_plane_to_dict(plane))})
+            _put_plane_ddb(plane)
             plane_ids.append(plane.gid)
         part_item = {
             "gid": part.gid,
@@ -182,65 +655,122 @@ async def create_part(request):
             "depth": part.depth,
             "planes": plane_ids,
         }
-        parts_table().put_item(Item={"gid": part.gid, "data": json.dumps(part_item)})
-    return JSONResponse(_part_to_dict(part, plane_list))
+        _put_item_ddb("parts", {"gid": part.gid, "data": json.dumps(part_item)})
+    part_data = _part_to_dict(part, plane_list)
+    saved = list(zip(plane_list, part_data["planes"]))
+    for plane, plane_data in saved:
+        feed.plane_saved(f"planes/{plane.gid}", plane, plane_data)
+    feed.part_saved(part.gid, part_data, saved, replace=True)
+    return JSONResponse(part_data)
 
 
 async def get_part(request):
     part_id = request.path_params["part_id"]
-    if boto3 is None:
+    if not USE_DYNAMODB:
         part = parts_mem.get(part_id)
         if part is None:
             raise HTTPException(status_code=404, detail="Part not found")
         planes = list(part_planes_mem.get(part_id, {}).values())
-        return JSONResponse(_part_to_dict(part, planes))
-    resp = parts_table().get_item(Key={"gid": part_id})
-    item = resp.get("Item")
-    if item is None:
+        return JSONResponse(_part_to_dict(part, planes), headers=_version_header(f"parts/{part_id}"))
+    part_data = _part_record_ddb(part_id)
+    if part_data is None:
         raise HTTPException(status_code=404, detail="Part not found")
-    part_data = json.loads(item["data"])
     o = part_data["origin"]
     origin = Point(o["gid"], o["x"], o["y"], o.get("z", 0.0))
     part = Part(part_data["gid"], origin, part_data["width"], part_data["height"], part_data["depth"])
-    planes = []
-    pt = planes_table()
-    for pid in part_data.get("planes", []):
-        presp = pt.get_item(Key={"gid": pid})
-        pitem = presp.get("Item")
-        if pitem:
-            planes.append(_plane_from_dict(json.loads(pitem["data"])))
-    return JSONResponse(_part_to_dict(part, planes))
+    bodies = _plane_bodies_ddb(part_data.get("planes", []))
+    planes = [_plane_from_dict(json.loads(body)) for body in bodies if body is not None]
+    return JSONResponse(_part_to_dict(part, planes), headers=_version_header(f"parts/{part_id}"))
 
 
 async def add_part_plane(request):
     part_id = request.path_params["part_id"]
-    data = await request.json()
+    data = await read_plane(request)
     plane = _plane_from_dict(data)
-    if boto3 is None:
+    if not USE_DYNAMODB:
         part = parts_mem.get(part_id)
         if part is None:
             raise HTTPException(status_code=404, detail="Part not found")
-        planes_mem[plane.gid] = plane
-        part_planes_mem.setdefault(part_id, {})[plane.gid] = plane
-        return JSONResponse(_plane_to_dict(plane))
-    parts_t = parts_table()
-    part_resp = parts_t.get_item(Key={"gid": part_id})
-    part_item = part_resp.get("Item")
-    if part_item is None:
+        _store_plane_mem(planes_mem, plane)
+        _store_plane_mem(part_planes_mem.setdefault(part_id, {}), plane)
+    else:
+        part_item = _get_item_ddb("parts", part_id)
+        if part_item is None:
+            raise HTTPException(status_code=404, detail="Part not found")
+        part_data = json.loads(part_item["data"])
+        _put_plane_ddb(plane)
+        plane_ids = part_data.get("planes", [])
+        plane_ids.append(plane.gid)
+        part_data["planes"] = plane_ids
+        _put_item_ddb("parts", {"gid": part_id, "data": json.dumps(part_data)})
+    plane_data = _plane_to_dict(plane)
+    feed.plane_saved(f"planes/{plane.gid}", plane, plane_data)
+    feed.plane_saved(f"parts/{part_id}", plane, plane_data)
+    return JSONResponse(plane_data)
+
+
+def _hit_response(index: ShapeIndex, request) -> JSONResponse:
+    try:
+        x = float(request.query_params["x"])
+        y = float(request.query_params["y"])
+        tolerance = float(request.query_params.get("tolerance", "inf"))
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Query parameters x and y must be numbers")
+    if not (math.isfinite(x) and math.isfinite(y)):
+        raise HTTPException(status_code=400, detail="Query parameters x and y must be finite")
+    if not tolerance >= 0:
+        raise HTTPException(status_code=400, detail="Query parameter tolerance must be a non-negative number")
+    hit = index.nearest_segment(x, y, tolerance)
+    nearest = None
+    if hit is not None:
+        nearest = {
+            "shape": hit.shape,
+            "segment": hit.segment,
+            "distance": hit.distance,
+            "point": {"x": hit.point.x, "y": hit.point.y},
+        }
+    return JSONResponse({"inside": index.contains(x, y), "nearest": nearest})
+
+
+async def plane_hit(request):
+    plane_id = request.path_params["plane_id"]
+    if not USE_DYNAMODB:
+        plane = planes_mem.get(plane_id)
+        if plane is None:
+            raise HTTPException(status_code=404, detail="Plane not found")
+        return _hit_response(plane.index, request)
+    item = _get_item_ddb("planes", plane_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Plane not found")
+    return _hit_response(_plane_index_ddb(json.loads(item["data"])), request)
+
+
+async def part_plane_hit(request):
+    part_id = request.path_params["part_id"]
+    plane_id = request.path_params["plane_id"]
+    if not USE_DYNAMODB:
+        part = parts_mem.get(part_id)
+        if part is None:
+            raise HTTPException(status_code=404, detail="Part not found")
+        plane = part_planes_mem.get(part_id, {}).get(plane_id)
+        if plane is None:
+            raise HTTPException(status_code=404, detail="Plane not found for part")
+        return _hit_response(plane.index, request)
+    part_data = _part_record_ddb(part_id)
+    if part_data is None:
         raise HTTPException(status_code=404, detail="Part not found")
-    part_data = json.loads(part_item["data"])
-    planes_table().put_item(Item={"gid": plane.gid, "data": json.dumps(_plane_to_dict(plane))})
-    plane_ids = part_data.get("planes", [])
-    plane_ids.append(plane.gid)
-    part_data["planes"] = plane_ids
-    parts_t.put_item(Item={"gid": part_id, "data": json.dumps(part_data)})
-    return JSONResponse(_plane_to_dict(plane))
+    if plane_id not in part_data.get("planes", []):
+        raise HTTPException(status_code=404, detail="Plane not found for part")
+    plane_item = _get_item_ddb("planes", plane_id)
+    if plane_item is None:
+        raise HTTPException(status_code=404, detail="Plane not found")
+    return _hit_response(_plane_index_ddb(json.loads(plane_item["data"])), request)
 
 
 async def get_part_plane(request):
     part_id = request.path_params["part_id"]
     plane_id = request.path_params["plane_id"]
-    if boto3 is None:
+    if not USE_DYNAMODB:
         part = parts_mem.get(part_id)
         if part is None:
             raise HTTPException(status_code=404, detail="Part not found")
@@ -248,37 +778,62 @@ async def get_part_plane(request):
         if plane is None:
             raise HTTPException(status_code=404, detail="Plane not found for part")
         return JSONResponse(_plane_to_dict(plane))
-    parts_t = parts_table()
-    part_resp = parts_t.get_item(Key={"gid": part_id})
-    part_item = part_resp.get("Item")
-    if part_item is None:
+    part_data = _part_record_ddb(part_id)
+    if part_data is None:
         raise HTTPException(status_code=404, detail="Part not found")
-    part_data = json.loads(part_item["data"])
     if plane_id not in part_data.get("planes", []):
         raise HTTPException(status_code=404, detail="Plane not found for part")
-    plane_resp = planes_table().get_item(Key={"gid": plane_id})
-    plane_item = plane_resp.get("Item")
-    if plane_item is None:
+    body = _plane_bodies_ddb([plane_id])[0]
+    if body is None:
         raise HTTPException(status_code=404, detail="Plane not found")
-    return JSONResponse(json.loads(plane_item["data"]))
+    return Response(body, media_type="application/json")
 
 
 routes = [
     Route("/planes", create_plane, methods=["POST"]),
     Route("/planes/{plane_id}", get_plane, methods=["GET"]),
+    Route("/planes/{plane_id}/changes", plane_changes, methods=["GET"]),
+    Route("/planes/{plane_id}/hit", plane_hit, methods=["GET"]),
     Route("/components/parts", create_part, methods=["POST"]),
     Route("/components/parts/{part_id}", get_part, methods=["GET"]),
+    Route("/components/parts/{part_id}/changes", part_changes, methods=["GET"]),
     Route("/components/parts/{part_id}/planes", add_part_plane, methods=["POST"]),
     Route(
         "/components/parts/{part_id}/planes/{plane_id}",
         get_part_plane,
         methods=["GET"],
     ),
+    Route(
+        "/components/parts/{part_id}/planes/{plane_id}/hit",
+        part_plane_hit,
+        methods=["GET"],
+    ),
+    Route("/jobs", submit_job, methods=["POST"]),
+    Route("/jobs/{job_id}", get_job, methods=["GET"]),
+    Route("/jobs/{job_id}", cancel_job, methods=["DELETE"]),
+    Route("/jobs/{job_id}/result", get_job_result, methods=["GET"]),
 ]
 
-app = Starlette(routes=routes)
-
 
 def setup_tables():
-    if boto3 is not None:
+    if USE_DYNAMODB:
         ensure_tables()
+        _flush_resource()
+        shared_cache()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Importing boto3, opening the first connection and checking the schema
+    # all happen here rather than on the first request.  Handlers use the
+    # resource from the event loop thread; it is never used concurrently.
+    await run_in_threadpool(setup_tables)
+    if write_buffer is not None:
+        await write_buffer.start()
+    yield
+    if write_buffer is not None:
+        await write_buffer.stop()
+    shutdown_jobs()
+
+
+app = Starlette(routes=routes, lifespan=lifespan)
@@ -0,0 +1,461 @@
+"""Host-wide read cache shared by all worker processes.
+
+With several uvicorn workers every process has its own memory, so a cache
+kept in module globals is duplicated in each worker and starts cold whenever
+a worker is recycled.  :class:`SharedCache` keeps serialised payloads in a
+single memory-mapped file instead, normally on ``/dev/shm`` so that it lives
+in RAM, which every worker on the host maps ``MAP_SHARED``:
+
+* a hash index maps keys to entries; values are stored in fixed-size blocks
+  chained together, so payloads of any size fit without fragmentation;
+* entries form a least-recently-used list and the oldest are evicted when
+  blocks run out.  As in memcached, a read only moves an entry to the front
+  if it has not been moved for ``bump_interval`` seconds, so nearly all
+  reads proceed under a shared lock;
+* every key maps to one of a fixed set of generation stamps.
+  :meth:`SharedCache.invalidate` bumps the stamp and drops the entry, and
+  :meth:`SharedCache.put` accepts the stamp read before the payload was
+  loaded so a payload that went stale in the meantime is discarded.
+
+Reads copy a value straight from the shared mapping into a ``bytes`` object
+ready to be sent; nothing is deserialised and no worker keeps a private
+copy.  Access is serialised between processes with ``flock`` and between
+threads with a lock.  The file is sparse, so the default capacity of a
+sixteenth of physical memory only costs what is actually stored.
+
+Pages of a sparse file are only allocated when they are first written, and
+a process touching a page its filesystem has no room for is killed with
+``SIGBUS``.  The capacity is therefore capped to half of the space free on
+the filesystem when the file is created.  Docker gives containers a 64 MiB
+``/dev/shm`` by default, which caps the cache at about 32 MiB; raise it with
+``shm_size`` (``--shm-size``) to at least twice the capacity wanted.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import fcntl
+import hashlib
+import mmap
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+BLOCK_SIZE = int(os.getenv("DAIKU_SHARED_CACHE_BLOCK_SIZE", "1024"))
+STAMPS = 4096
+
+_MAGIC = 0x3143434B5549414B  # b"DAIKUCC1"
+_NIL = -1
+# Header fields, stored as int64.
+(
+    _H_MAGIC,
+    _H_BLOCK_SIZE,
+    _H_BLOCKS,
+    _H_STAMPS,
+    _H_DIRTY,
+    _H_COUNT,
+    _H_FREE_BLOCK,
+    _H_FREE_BLOCKS,
+    _H_FREE_ENTRY,
+    _H_LRU_HEAD,
+    _H_LRU_TAIL,
+) = range(11)
+_HEADER = 16
+
+# Per-block arrays; there are as many entry slots as blocks because every
+# entry uses at least one block.
+_SECTIONS = (
+    ("buckets", np.int32),
+    ("e_hash", np.uint64),
+    ("e_touched", np.float64),
+    ("e_size", np.int64),  # key plus value bytes
+    ("e_key", np.int32),  # key bytes
+    ("e_chain", np.int32),  # bucket chain, or free list
+    ("e_prev", np.int32),  # LRU neighbour towards the most recent entry
+    ("e_next", np.int32),  # LRU neighbour towards the least recent entry
+    ("e_block", np.int32),  # first data block
+    ("b_next", np.int32),  # next block of an entry, or free list
+)
+_PER_BLOCK = sum(np.dtype(dtype).itemsize for _, dtype in _SECTIONS)
+
+
+def default_capacity() -> int:
+    """A sixteenth of physical memory, and at least 1 MiB.
+
+    :class:`SharedCache` further caps it to the room left on the filesystem.
+    """
+
+    try:
+        ram = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, OSError, ValueError):  # pragma: no cover
+        ram = 1 << 30
+    return max(ram // 16, 1 << 20)
+
+
+def _room(fd: int) -> int:
+    """Half the bytes still free on the filesystem holding ``fd``."""
+
+    st = os.fstatvfs(fd)
+    return st.f_bavail * st.f_frsize // 2
+
+
+def _hash(key: bytes) -> int:
+    # ``hash()`` is salted per process, so it cannot be shared.
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def _layout(blocks: int, block_size: int, stamps: int) -> Tuple[Dict[str, Tuple[int, type, int]], int, int]:
+    """Offsets of every section and of the data area, and the file size."""
+
+    sections = {"header": (0, np.int64, _HEADER), "stamps": (_HEADER * 8, np.uint64, stamps)}
+    offset = (_HEADER + stamps) * 8
+    for name, dtype in _SECTIONS:
+        sections[name] = (offset, dtype, blocks)
+        offset = (offset + blocks * np.dtype(dtype).itemsize + 7) & ~7
+    return sections, offset, offset + blocks * block_size
+
+
+class SharedCache:
+    """LRU cache of byte strings in a memory-mapped file.
+
+    Parameters
+    ----------
+    path:
+        File backing the cache.  Every process opening the same path shares
+        the same entries; the first one creates and sizes it, later ones
+        adopt its geometry.
+    capacity:
+        Size of the file in bytes, index included.  Defaults to
+        :func:`default_capacity`.  Never more than half the space free on
+        the filesystem when the file is created.
+    block_size:
+        Allocation unit for values.
+    stamps:
+        Number of invalidation stamps keys are spread over.
+    bump_interval:
+        Minimum time in seconds between two moves of an entry to the front
+        of the LRU list.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capacity: Optional[int] = None,
+        block_size: int = BLOCK_SIZE,
+        stamps: int = STAMPS,
+        bump_interval: float = 1.0,
+    ):
+        self.path = path
+        self.bump_interval = bump_interval
+        self._geometry = (capacity or default_capacity(), block_size, stamps)
+        self._fd = -1
+        self._open()
+
+    # Setup -----------------------------------------------------------------
+    def _open(self) -> None:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if not self._valid(fd):
+                    self._create(fd)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            mm = mmap.mmap(fd, os.fstat(fd).st_size)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._map(mm)
+
+    @staticmethod
+    def _valid(fd: int) -> bool:
+        header = np.frombuffer(os.pread(fd, _HEADER * 8, 0), np.int64)
+        if len(header) < _HEADER or header[_H_MAGIC] != _MAGIC:
+            return False
+        blocks, block_size, stamps = (int(header[i]) for i in (_H_BLOCKS, _H_BLOCK_SIZE, _H_STAMPS))
+        return os.fstat(fd).st_size == _layout(blocks, block_size, stamps)[2]
+
+    def _create(self, fd: int) -> None:
+        capacity, block_size, stamps = self._geometry
+        # Free a stale file first so its pages count as room.
+        os.ftruncate(fd, 0)
+        capacity = min(capacity, _room(fd))
+        fixed = _layout(0, block_size, stamps)[2] + 8 * len(_SECTIONS)
+        blocks = (capacity - fixed) // (block_size + _PER_BLOCK)
+        if blocks < 1:
+            raise ValueError(f"capacity of {capacity} bytes is too small")
+        size = _layout(blocks, block_size, stamps)[2]
+        os.ftruncate(fd, size)
+        mm = mmap.mmap(fd, size)
+        try:
+            geometry = np.frombuffer(mm, np.int64, _HEADER)
+            geometry[[_H_BLOCK_SIZE, _H_BLOCKS, _H_STAMPS]] = block_size, blocks, stamps
+            del geometry
+            self._map(mm)
+            try:
+                self._reset()
+                self._header[_H_MAGIC] = _MAGIC
+            finally:
+                self._unmap()
+        finally:
+            mm.close()
+
+    def _map(self, mm: mmap.mmap) -> None:
+        header = np.frombuffer(mm, np.int64, _HEADER)
+        self.blocks = int(header[_H_BLOCKS])
+        self.block_size = int(header[_H_BLOCK_SIZE])
+        sections, data, _ = _layout(self.blocks, self.block_size, int(header[_H_STAMPS]))
+        del header
+        self._mm = mm
+        # ``self._header``, ``self._stamps``, ``self._e_hash`` and so on.
+        for name, (offset, dtype, count) in sections.items():
+            setattr(self, f"_{name}", np.frombuffer(mm, dtype, count, offset))
+        self._sections = tuple(sections)
+        self._data = memoryview(mm)[data:]
+        # Values too large for this share of the cache are not stored.
+        self.max_size = self.blocks * self.block_size // 8
+
+    def _unmap(self) -> None:
+        # The mapping can only be closed once no views into it are left.
+        for name in self._sections:
+            setattr(self, f"_{name}", None)
+        self._data.release()
+        self._data = None
+        self._mm = None
+
+    def _reset(self) -> None:
+        n = self.blocks
+        self._stamps += 1
+        self._buckets.fill(_NIL)
+        self._e_chain[:] = np.arange(1, n + 1)
+        self._e_chain[-1] = _NIL
+        self._b_next[:] = np.arange(1, n + 1)
+        self._b_next[-1] = _NIL
+        h = self._header
+        h[_H_COUNT] = 0
+        h[_H_FREE_BLOCK] = 0
+        h[_H_FREE_BLOCKS] = n
+        h[_H_FREE_ENTRY] = 0
+        h[_H_LRU_HEAD] = h[_H_LRU_TAIL] = _NIL
+        h[_H_DIRTY] = 0
+
+    def close(self) -> None:
+        if self._fd < 0:
+            return
+        mm = self._mm
+        self._unmap()
+        mm.close()
+        os.close(self._fd)
+        self._fd = -1
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        if os.getpid() != self._pid:
+            # A forked child shares the parent's open file description and
+            # with it the flock; it needs its own.
+            self.close()
+            self._open()
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                if self._header[_H_DIRTY]:
+                    # A process died half way through a write; start over.
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+                    if self._header[_H_DIRTY]:
+                        self._reset()
+                if exclusive:
+                    self._header[_H_DIRTY] = 1
+                yield
+                if exclusive:
+                    self._header[_H_DIRTY] = 0
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # Public API --------------------------------------------------------------
+    def __len__(self) -> int:
+        with self._locked(False):
+            return int(self._header[_H_COUNT])
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the value stored for ``key``, or ``None``."""
+
+        raw = key.encode()
+        h = _hash(raw)
+        with self._locked(False):
+            entry = self._find(raw, h)
+            if entry == _NIL:
+                return None
+            value = self._read(entry, len(raw), int(self._e_size[entry]) - len(raw))
+            bump = time.time() - self._e_touched[entry] >= self.bump_interval
+        if bump:
+            with self._locked(True):
+                entry = self._find(raw, h)
+                if entry != _NIL:
+                    self._unlink(entry)
+                    self._push(entry)
+        return value
+
+    def stamp(self, key: str) -> int:
+        """Current invalidation stamp of ``key``; see :meth:`put`."""
+
+        with self._locked(False):
+            return int(self._stamps[_hash(key.encode()) % len(self._stamps)])
+
+    def put(self, key: str, value: bytes, stamp: Optional[int] = None) -> bool:
+        """Store ``value`` under ``key``, evicting old entries as needed.
+
+        If ``stamp`` is given and ``key`` has been invalidated since it was
+        read with :meth:`stamp`, nothing is stored.  Returns whether the
+        value was stored.
+        """
+
+        raw = key.encode()
+        h = _hash(raw)
+        size = len(raw) + len(value)
+        if size > self.max_size:
+            return False
+        need = max(1, -(-size // self.block_size))
+        with self._locked(True):
+            if stamp is not None and int(self._stamps[h % len(self._stamps)]) != stamp:
+                return False
+            entry = self._find(raw, h)
+            if entry != _NIL:
+                self._remove(entry)
+            while self._header[_H_FREE_BLOCKS] < need:
+                self._remove(int(self._header[_H_LRU_TAIL]))
+            entry = self._store(h, raw, value, need)
+            bucket = h % self.blocks
+            self._e_chain[entry] = self._buckets[bucket]
+            self._buckets[bucket] = entry
+            self._push(entry)
+            self._header[_H_COUNT] += 1
+        return True
+
+    def invalidate(self, key: str) -> None:
+        """Drop ``key`` in every process and reject puts of older loads."""
+
+        raw = key.encode()
+        h = _hash(raw)
+        with self._locked(True):
+            self._stamps[h % len(self._stamps)] += 1
+            entry = self._find(raw, h)
+            if entry != _NIL:
+                self._remove(entry)
+
+    def clear(self) -> None:
+        with self._locked(True):
+            self._reset()
+
+    # Internals ---------------------------------------------------------------
+    def _find(self, raw: bytes, h: int) -> int:
+        entry = int(self._buckets[h % self.blocks])
+        while entry != _NIL:
+            if (
+                int(self._e_hash[entry]) == h
+                and self._e_key[entry] == len(raw)
+                and self._read(entry, 0, len(raw)) == raw
+            ):
+                return entry
+            entry = int(self._e_chain[entry])
+        return _NIL
+
+    def _read(self, entry: int, start: int, length: int) -> bytes:
+        bs = self.block_size
+        block = int(self._e_block[entry])
+        for _ in range(start // bs):
+            block = int(self._b_next[block])
+        offset = start % bs
+        pieces = []
+        while length > 0:
+            n = min(bs - offset, length)
+            base = block * bs + offset
+            pieces.append(self._data[base:base + n])
+            length -= n
+            offset = 0
+            block = int(self._b_next[block])
+        return b"".join(pieces)
+
+    def _store(self, h: int, raw: bytes, value: bytes, need: int) -> int:
+        header = self._header
+        entry = int(header[_H_FREE_ENTRY])
+        header[_H_FREE_ENTRY] = self._e_chain[entry]
+
+        blocks = []
+        block = int(header[_H_FREE_BLOCK])
+        for _ in range(need):
+            blocks.append(block)
+            block = int(self._b_next[block])
+        header[_H_FREE_BLOCK] = block
+        header[_H_FREE_BLOCKS] -= need
+        self._b_next[blocks[-1]] = _NIL
+
+        bs = self.block_size
+        pos = 0
+        for buf in (raw, value):
+            view = memoryview(buf)
+            while len(view):
+                offset = pos % bs
+                n = min(bs - offset, len(view))
+                base = blocks[pos // bs] * bs + offset
+                self._data[base:base + n] = view[:n]
+                view = view[n:]
+                pos += n
+
+        self._e_hash[entry] = h
+        self._e_key[entry] = len(raw)
+        self._e_size[entry] = pos
+        self._e_block[entry] = blocks[0]
+        return entry
+
+    def _remove(self, entry: int) -> None:
+        # Bucket chain.
+        bucket = int(self._e_hash[entry]) % self.blocks
+        prev, current = _NIL, int(self._buckets[bucket])
+        while current != entry:
+            prev, current = current, int(self._e_chain[current])
+        if prev == _NIL:
+            self._buckets[bucket] = self._e_chain[entry]
+        else:
+            self._e_chain[prev] = self._e_chain[entry]
+        self._unlink(entry)
+        # Blocks go back to the front of the free list.
+        header = self._header
+        last = int(self._e_block[entry])
+        count = 1
+        while self._b_next[last] != _NIL:
+            last = int(self._b_next[last])
+            count += 1
+        self._b_next[last] = header[_H_FREE_BLOCK]
+        header[_H_FREE_BLOCK] = self._e_block[entry]
+        header[_H_FREE_BLOCKS] += count
+        self._e_chain[entry] = header[_H_FREE_ENTRY]
+        header[_H_FREE_ENTRY] = entry
+        header[_H_COUNT] -= 1
+
+    def _unlink(self, entry: int) -> None:
+        prev, nxt = int(self._e_prev[entry]), int(self._e_next[entry])
+        if prev == _NIL:
+            self._header[_H_LRU_HEAD] = nxt
+        else:
+            self._e_next[prev] = nxt
+        if nxt == _NIL:
+            self._header[_H_LRU_TAIL] = prev
+        else:
+            self._e_prev[nxt] = prev
+
+    def _push(self, entry: int) -> None:
+        head = int(self._header[_H_LRU_HEAD])
+        self._e_prev[entry] = _NIL
+        self._e_next[entry] = head
+        if head == _NIL:
+            self._header[_H_LRU_TAIL] = entry
+        else:
+            self._e_prev[head] = entry
+        self._header[_H_LRU_HEAD] = entry
+        self._e_touched[entry] = time.time()
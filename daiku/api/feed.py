@@ -0,0 +1,291 @@
+"""Incremental change feed for parts and planes.
+
+Instead of re-fetching whole parts to detect edits, clients subscribe to a
+Server-Sent Events stream and receive compact deltas as handlers modify
+state.  Every topic (``parts/{gid}`` or ``planes/{gid}``) has its own version
+counter; each delta carries the version it produced, which is also sent as
+the SSE event id so a reconnecting client resumes via ``Last-Event-ID`` or
+``?since=``.  Versions are ``epoch:counter`` tokens.  Counters are kept in
+memory and the epoch is chosen at random when the process starts, so a
+token from another worker or an earlier process is recognised and answered
+with a ``reset`` rather than with unrelated deltas.
+
+Deltas are derived by comparing saved planes with the shape hashes last seen
+for that topic, so they work the same for every storage backend:
+
+``part``
+    Origin or dimensions changed.
+``plane``
+    A plane was added or its origin/normal changed; carries the full plane.
+``plane_removed``
+    A plane is no longer part of the part.
+``shapes_added``
+    Shapes were appended to a plane starting at index ``start``.
+``shapes_replaced``
+    A plane's shapes changed in some other way; carries all of them.
+``reset``
+    The requested version is no longer retained; reload the resource.
+
+The feed lives in the worker process, so with several workers a client only
+sees changes made through the worker it is connected to.  It keeps state for
+at most ``DAIKU_FEED_TOPICS`` topics; the least recently changed topic without
+subscribers is forgotten first, and clients resuming it get a ``reset``.
+Retained deltas are limited to ``DAIKU_FEED_HISTORY`` per topic and
+``DAIKU_FEED_BYTES`` of JSON overall; past that, the logs of the least
+recently changed topics are dropped first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import secrets
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.exceptions import HTTPException
+from starlette.responses import StreamingResponse
+
+from daiku.geo.shape import shape_hash
+from daiku.parts import Plane
+
+HISTORY = int(os.getenv("DAIKU_FEED_HISTORY", "256"))
+KEEPALIVE = float(os.getenv("DAIKU_FEED_KEEPALIVE", "15"))
+MAX_TOPICS = int(os.getenv("DAIKU_FEED_TOPICS", "4096"))
+MAX_BYTES = int(os.getenv("DAIKU_FEED_BYTES", str(64 * 1024 * 1024)))
+
+
+class ChangeFeed:
+    """Versioned, bounded delta log per topic."""
+
+    def __init__(self, history: int = HISTORY, max_topics: int = MAX_TOPICS, max_bytes: int = MAX_BYTES):
+        self.history = history
+        self.max_topics = max_topics
+        self.max_bytes = max_bytes
+        self.epoch = secrets.token_hex(4)
+        # Least recently changed topic first, in both.
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._log: "OrderedDict[str, Deque[Tuple[dict, int]]]" = OrderedDict()
+        # Size of the JSON of every retained delta.
+        self._bytes = 0
+        self._events: Dict[str, asyncio.Event] = {}
+        self._subscribers: Dict[str, int] = {}
+        # Topics start above every version handed out for a forgotten one,
+        # so a client resuming one of those is told to reload.
+        self._horizon = 0
+        # Last seen state used to compute deltas.
+        self._parts: Dict[str, dict] = {}
+        self._planes: Dict[str, Dict[str, Tuple[dict, List[str]]]] = {}
+
+    def version(self, topic: str) -> int:
+        return self._versions.get(topic, self._horizon)
+
+    def token(self, version: int) -> str:
+        """Version as handed to clients."""
+
+        return f"{self.epoch}:{version}"
+
+    def parse(self, token: str) -> Optional[int]:
+        """Counter of a version ``token``, or ``None`` if another process issued it.
+
+        Raises :class:`ValueError` for malformed tokens.
+        """
+
+        epoch, sep, counter = token.rpartition(":")
+        if not sep:
+            raise ValueError(token)
+        version = int(counter)
+        return version if epoch == self.epoch else None
+
+    def subscribe(self, topic: str) -> None:
+        """Keep ``topic`` from being forgotten while a stream follows it."""
+
+        self._subscribers[topic] = self._subscribers.get(topic, 0) + 1
+
+    def unsubscribe(self, topic: str) -> None:
+        count = self._subscribers.pop(topic) - 1
+        if count:
+            self._subscribers[topic] = count
+        else:
+            self._events.pop(topic, None)
+
+    def _touch(self, topic: str) -> None:
+        if topic in self._versions:
+            self._versions.move_to_end(topic)
+            return
+        self._versions[topic] = self._horizon
+        excess = len(self._versions) - self.max_topics
+        victims = []
+        for old in self._versions:
+            if excess <= len(victims):
+                break
+            if old != topic and old not in self._subscribers:
+                victims.append(old)
+        for old in victims:
+            self._horizon = max(self._horizon, self._versions.pop(old))
+            self._drop_log(old)
+            self._parts.pop(old, None)
+            self._planes.pop(old, None)
+
+    def publish(self, topic: str, delta: dict) -> int:
+        self._touch(topic)
+        version = self.version(topic) + 1
+        self._versions[topic] = version
+        delta = dict(delta, version=version)
+        size = len(json.dumps(delta))
+        log = self._log.setdefault(topic, deque())
+        self._log.move_to_end(topic)
+        log.append((delta, size))
+        self._bytes += size
+        if len(log) > self.history:
+            self._bytes -= log.popleft()[1]
+        while self._bytes > self.max_bytes:
+            # Oldest topics lose their whole log; the one just changed keeps
+            # at least its latest delta.
+            oldest = next(iter(self._log))
+            if oldest != topic:
+                self._drop_log(oldest)
+            elif len(log) > 1:
+                self._bytes -= log.popleft()[1]
+            else:
+                break
+        event = self._events.pop(topic, None)
+        if event is not None:
+            event.set()
+        return version
+
+    def _drop_log(self, topic: str) -> None:
+        log = self._log.pop(topic, ())
+        self._bytes -= sum(size for _, size in log)
+
+    def since(self, topic: str, version: Optional[int]) -> Optional[List[dict]]:
+        """Deltas after ``version``, or ``None`` if some were discarded.
+
+        ``version`` is ``None`` for a token from another process.
+        """
+
+        log = self._log.get(topic, ())
+        current = self.version(topic)
+        if version is None or version > current:
+            # The client must reload.
+            return None
+        if version == current:
+            return []
+        if not log or log[0][0]["version"] > version + 1:
+            return None
+        return [d for d, _ in log if d["version"] > version]
+
+    async def wait(self, topic: str, version: int, timeout: float) -> bool:
+        """Wait until ``topic`` moves past ``version``; ``False`` on timeout."""
+
+        if self.version(topic) > version:
+            return True
+        event = self._events.setdefault(topic, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    # Delta builders ------------------------------------------------------
+    def plane_saved(self, topic: str, plane: Plane, data: dict) -> None:
+        """Record that ``plane`` (serialised as ``data``) was stored."""
+
+        self._touch(topic)
+        known = self._planes.setdefault(topic, {})
+        header = {"origin": data["origin"], "normal": data["normal"]}
+        keys = [shape_hash(shape) for shape in plane.shapes]
+        previous = known.get(plane.gid)
+        known[plane.gid] = (header, keys)
+        if previous is None or previous[0] != header:
+            self.publish(topic, {"op": "plane", "plane": data})
+            return
+        old_keys = previous[1]
+        if keys == old_keys:
+            return
+        if keys[: len(old_keys)] == old_keys:
+            start = len(old_keys)
+            self.publish(
+                topic,
+                {"op": "shapes_added", "plane": plane.gid, "start": start, "shapes": data["shapes"][start:]},
+            )
+        else:
+            self.publish(topic, {"op": "shapes_replaced", "plane": plane.gid, "shapes": data["shapes"]})
+
+    def part_saved(self, part_id: str, data: dict, planes: List[Tuple[Plane, dict]], replace: bool) -> None:
+        """Record a stored part.
+
+        Only the origin and dimensions are taken from ``data``.  When
+        ``replace`` is true ``planes`` is the complete plane list and planes
+        missing from it are reported as removed.
+        """
+
+        topic = f"parts/{part_id}"
+        self._touch(topic)
+        fields = {k: data[k] for k in ("origin", "width", "height", "depth")}
+        if self._parts.get(topic) != fields:
+            self._parts[topic] = fields
+            self.publish(topic, dict(fields, op="part"))
+        if replace:
+            known = self._planes.setdefault(topic, {})
+            current = {plane.gid for plane, _ in planes}
+            for gid in [gid for gid in known if gid not in current]:
+                del known[gid]
+                self.publish(topic, {"op": "plane_removed", "plane": gid})
+        for plane, plane_data in planes:
+            self.plane_saved(topic, plane, plane_data)
+
+
+feed = ChangeFeed()
+
+
+def _since(request, topic: str) -> Optional[int]:
+    raw = request.query_params.get("since") or request.headers.get("last-event-id")
+    if raw is None:
+        return feed.version(topic)
+    try:
+        return feed.parse(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid version")
+
+
+def _event(delta: dict) -> str:
+    token = feed.token(delta["version"])
+    return f"id: {token}\nevent: {delta['op']}\ndata: {json.dumps(dict(delta, version=token))}\n\n"
+
+
+async def _stream(topic: str, version: Optional[int]):
+    feed.subscribe(topic)
+    try:
+        while True:
+            deltas = feed.since(topic, version)
+            if deltas is None:
+                version = feed.version(topic)
+                yield _event({"op": "reset", "version": version})
+                continue
+            for delta in deltas:
+                version = delta["version"]
+                yield _event(delta)
+            if not await feed.wait(topic, version, KEEPALIVE):
+                yield ": keep-alive\n\n"
+    finally:
+        feed.unsubscribe(topic)
+
+
+def _feed_response(topic: str, request) -> StreamingResponse:
+    return StreamingResponse(
+        _stream(topic, _since(request, topic)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# API endpoints -------------------------------------------------------------
+
+async def part_changes(request):
+    return _feed_response(f"parts/{request.path_params['part_id']}", request)
+
+
+async def plane_changes(request):
+    return _feed_response(f"planes/{request.path_params['plane_id']}", request)
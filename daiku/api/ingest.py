@@ -0,0 +1,347 @@
+"""Incremental ingest of part and plane payloads.
+
+``await request.json()`` buffers the whole body and then builds a complete
+dict tree, so a multi-megabyte upload exists twice in memory before a single
+``V2D`` is created.  The parser here consumes ``request.stream()`` chunk by
+chunk instead:
+
+* the body is tokenised as it arrives and only the unparsed tail of the
+  current chunk is kept.  A string running past the end of a chunk is
+  collected piece by piece instead of being rescanned from its start;
+* every value is checked against a small schema as soon as it is complete,
+  so malformed payloads fail early with a 400 naming the offending field
+  (for example ``planes[0].shapes[3][7].y: expected a number``);
+* shape vertices are written straight into packed ``float64`` buffers rather
+  than into ``{"x": ..., "y": ...}`` dicts, and unknown fields are skipped
+  without being materialised.
+
+Shapes come out as ``(n, 2)`` arrays in the layout of
+:func:`daiku.geo.shape.pack_shape`.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import math
+import os
+import re
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from starlette.exceptions import HTTPException
+
+MAX_BODY_BYTES = int(os.getenv("DAIKU_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+
+
+# Schema ----------------------------------------------------------------------
+
+NUMBER = "a number"
+STRING = "a string"
+SKIP = "anything"
+SHAPE = "a list of points"
+
+
+class Obj:
+    def __init__(self, fields: Dict[str, object], required: Tuple[str, ...] = ()):
+        self.fields = fields
+        self.required = required
+
+
+class Seq:
+    def __init__(self, item: object):
+        self.item = item
+
+
+VERTEX = Obj({"x": NUMBER, "y": NUMBER}, ("x", "y"))
+ORIGIN = Obj({"gid": STRING, "x": NUMBER, "y": NUMBER, "z": NUMBER}, ("gid", "x", "y"))
+NORMAL = Obj({"x": NUMBER, "y": NUMBER, "z": NUMBER}, ("x", "y"))
+PLANE = Obj(
+    {"gid": STRING, "origin": ORIGIN, "normal": NORMAL, "shapes": Seq(SHAPE)},
+    ("gid", "origin", "normal"),
+)
+PART = Obj(
+    {
+        "gid": STRING,
+        "origin": ORIGIN,
+        "width": NUMBER,
+        "height": NUMBER,
+        "depth": NUMBER,
+        "planes": Seq(PLANE),
+    },
+    ("gid", "origin", "width", "height", "depth"),
+)
+
+
+# Tokeniser -------------------------------------------------------------------
+
+_WS = re.compile(r"[ \t\n\r]*")
+# Rest of a string up to its closing quote, or up to the end of the buffer
+# (short of a trailing backslash whose escaped character is still to come).
+_STRING_REST = re.compile(r'(?:[^"\\]|\\[\s\S])*')
+_TOKEN = re.compile(
+    r'([{}\[\],:])'
+    r'|("(?:[^"\\]|\\[\s\S])*")'
+    # Numbers are matched loosely so one split across chunks is never taken
+    # for a shorter valid prefix; ``_NUMBER`` validates them afterwards.
+    r'|(-?[0-9][0-9.eE+-]*)'
+    r'|(true|false|null)'
+)
+_NUM = r"(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?)"
+_NUMBER = re.compile(_NUM)
+# Fast path for the overwhelmingly common ``{"x": 1, "y": 2}`` vertex.
+_VERTEX = re.compile(
+    r'[ \t\n\r]*\{[ \t\n\r]*"x"[ \t\n\r]*:[ \t\n\r]*' + _NUM
+    + r'[ \t\n\r]*,[ \t\n\r]*"y"[ \t\n\r]*:[ \t\n\r]*' + _NUM + r'[ \t\n\r]*\}'
+)
+_NEXT_VERTEX = re.compile(r"[ \t\n\r]*," + _VERTEX.pattern)
+# Longest number kept waiting for the rest of a chunk, so a runaway one
+# cannot be rescanned over and over.
+_MAX_NUMBER = 512
+
+
+def _bad(path: str, message: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=f"{path or 'body'}: {message}")
+
+
+def _string(path: str, text: str) -> str:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as exc:
+        raise _bad(path, f"invalid string ({exc.msg.lower()})")
+
+
+def _describe(schema) -> str:
+    if isinstance(schema, Obj):
+        return "an object"
+    if isinstance(schema, Seq):
+        return "a list"
+    return schema
+
+
+# Frame states
+_OPEN, _COLON, _VALUE, _NEXT, _KEY = range(5)
+
+
+class _Frame:
+    __slots__ = ("schema", "path", "is_obj", "value", "key", "state", "count")
+
+    def __init__(self, schema, path: str, is_obj: bool, value):
+        self.schema = schema
+        self.path = path
+        self.is_obj = is_obj
+        self.value = value
+        self.key: Optional[str] = None
+        self.state = _OPEN
+        self.count = 0
+
+
+class StreamParser:
+    """Push parser validating a JSON document against ``schema``.
+
+    Feed the body with :meth:`feed`; once the final chunk has been fed the
+    parsed document is available as :attr:`result`.  Problems are reported
+    as :class:`~starlette.exceptions.HTTPException` with status 400.
+    """
+
+    def __init__(self, schema: Obj):
+        self.schema = schema
+        self.stack: List[_Frame] = []
+        self.result = None
+        self.done = False
+        self._buffer = ""
+        # Pieces of a string continuing past the end of the buffer.
+        self._string: Optional[List[str]] = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._offset = 0
+
+    def feed(self, chunk: bytes, final: bool = False) -> None:
+        try:
+            self._buffer += self._decoder.decode(chunk, final)
+        except UnicodeDecodeError:
+            raise _bad("", "body is not valid UTF-8")
+        pos = self._consume(self._buffer, final)
+        self._offset += pos
+        self._buffer = self._buffer[pos:]
+        if final and not self.done:
+            raise _bad(self._where(), "unexpected end of body")
+
+    def _where(self) -> str:
+        return self.stack[-1].path if self.stack else ""
+
+    def _consume(self, buf: str, final: bool) -> int:
+        pos = 0
+        end = len(buf)
+        stack = self.stack
+        if self._string is not None:
+            pos = _STRING_REST.match(buf).end()
+            self._string.append(buf[:pos])
+            if pos == end or buf[pos] != '"':
+                return pos
+            pos += 1
+            text, self._string = "".join(self._string) + '"', None
+            self._token(2, text)
+        while True:
+            pos = _WS.match(buf, pos).end()
+            if pos == end:
+                return pos
+            if self.done:
+                raise _bad("", f"unexpected data at character {self._offset + pos}")
+            top = stack[-1] if stack else None
+            if top is not None and top.schema is SHAPE and top.state in (_OPEN, _VALUE):
+                m = _VERTEX.match(buf, pos)
+                if m is not None:
+                    append = top.value.append
+                    while m is not None:
+                        append(float(m.group(1)) + 0.0)
+                        append(float(m.group(2)) + 0.0)
+                        top.count += 1
+                        pos = m.end()
+                        m = _NEXT_VERTEX.match(buf, pos)
+                    top.state = _NEXT
+                    continue
+            m = _TOKEN.match(buf, pos)
+            if m is None:
+                tail = buf[pos:pos + 5]
+                if buf[pos] == '"' and not final:
+                    # Unterminated string: keep what there is and go on
+                    # from its end when the next chunk arrives.
+                    start, pos = pos, _STRING_REST.match(buf, pos + 1).end()
+                    self._string = [buf[start:pos]]
+                    return pos
+                # Otherwise only a prefix of a literal or a lone minus sign
+                # may still become valid with more data.
+                if final or not (tail == "-" or any(w.startswith(tail) for w in ("true", "false", "null"))):
+                    raise _bad(self._where(), f"invalid JSON at character {self._offset + pos}")
+                return pos
+            if m.end() == end and not final and m.lastindex in (3, 4):
+                if m.end() - pos > _MAX_NUMBER:
+                    raise _bad(self._where(), "number too long")
+                return pos
+            pos = m.end()
+            self._token(m.lastindex, m.group(m.lastindex))
+
+    def _token(self, kind: int, text: str) -> None:
+        if not self.stack:
+            self._value(kind, text, self.schema, "")
+            return
+        top = self.stack[-1]
+        if kind == 1 and text in "]}":
+            self._close(top, text)
+        elif top.state == _NEXT:
+            if kind != 1 or text != ",":
+                raise _bad(top.path, "expected ',' or a closing bracket")
+            top.state = _KEY if top.is_obj else _VALUE
+        elif top.is_obj and top.state in (_OPEN, _KEY):
+            if kind != 2:
+                raise _bad(top.path, "expected a field name")
+            top.key = _string(top.path, text)
+            top.state = _COLON
+        elif top.state == _COLON:
+            if kind != 1 or text != ":":
+                raise _bad(top.path, "expected ':'")
+            top.state = _VALUE
+        else:
+            top.state = _NEXT
+            self._value(kind, text, *self._child(top))
+
+    def _child(self, top: _Frame):
+        if top.schema is SKIP:
+            return SKIP, top.path
+        if top.schema is SHAPE:
+            return VERTEX, f"{top.path}[{top.count}]"
+        if isinstance(top.schema, Seq):
+            return top.schema.item, f"{top.path}[{top.count}]"
+        path = f"{top.path}.{top.key}" if top.path else top.key
+        return top.schema.fields.get(top.key, SKIP), path
+
+    def _value(self, kind: int, text: str, schema, path: str) -> None:
+        if kind == 1:
+            if text == "{" and (isinstance(schema, Obj) or schema is SKIP):
+                self.stack.append(_Frame(schema, path, True, {} if schema is not SKIP else None))
+            elif text == "[" and (isinstance(schema, Seq) or schema in (SHAPE, SKIP)):
+                value = array("d") if schema is SHAPE else [] if schema is not SKIP else None
+                self.stack.append(_Frame(schema, path, False, value))
+            elif text in "{[":
+                raise _bad(path, f"expected {_describe(schema)}")
+            else:
+                raise _bad(path, f"unexpected '{text}'")
+        elif kind == 3 and not _NUMBER.fullmatch(text):
+            raise _bad(path, f"invalid number '{text}'")
+        elif kind == 2 and schema is STRING:
+            self._deliver(_string(path, text))
+        elif schema is SKIP:
+            if kind == 2:
+                _string(path, text)
+            self._deliver(None)
+        elif kind == 3 and schema is NUMBER:
+            # Out of range numbers such as 1e999 parse as infinity, which
+            # could be stored but never serialised again.
+            number = float(text)
+            if not math.isfinite(number):
+                raise _bad(path, "expected a finite number")
+            self._deliver(number if any(c in text for c in ".eE") else int(text))
+        else:
+            raise _bad(path, f"expected {_describe(schema)}")
+
+    def _close(self, top: _Frame, bracket: str) -> None:
+        if (bracket == "}") != top.is_obj or top.state not in (_OPEN, _NEXT):
+            raise _bad(top.path, f"unexpected '{bracket}'")
+        self.stack.pop()
+        if isinstance(top.schema, Obj):
+            for name in top.schema.required:
+                if name not in top.value:
+                    raise _bad(top.path, f"missing field '{name}'")
+        if top.schema is VERTEX:
+            shape = self.stack[-1]
+            shape.value.append(float(top.value["x"]) + 0.0)
+            shape.value.append(float(top.value["y"]) + 0.0)
+            shape.count += 1
+        elif top.schema is SHAPE:
+            vertices = np.frombuffer(top.value, dtype="<f8").reshape(-1, 2)
+            # The fast path above converts vertices without checking them.
+            bad = np.flatnonzero(~np.isfinite(vertices).all(axis=1))
+            if len(bad):
+                raise _bad(f"{top.path}[{bad[0]}]", "expected a finite number")
+            self._deliver(vertices)
+        else:
+            self._deliver(top.value)
+
+    def _deliver(self, value) -> None:
+        if not self.stack:
+            self.result = value
+            self.done = True
+            return
+        top = self.stack[-1]
+        top.count += 1
+        if top.schema is SKIP:
+            return
+        if top.is_obj:
+            if top.key in top.schema.fields:
+                top.value[top.key] = value
+        else:
+            top.value.append(value)
+
+
+async def parse(request, schema: Obj) -> dict:
+    """Parse and validate the body of ``request`` against ``schema``."""
+
+    parser = StreamParser(schema)
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="Request body too large")
+        if chunk:
+            parser.feed(chunk)
+    parser.feed(b"", final=True)
+    return parser.result
+
+
+async def read_plane(request) -> dict:
+    return await parse(request, PLANE)
+
+
+async def read_part(request) -> dict:
+    return await parse(request, PART)
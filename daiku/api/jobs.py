@@ -0,0 +1,265 @@
+"""Background jobs for CPU heavy geometry work.
+
+Handlers must not run expensive geometry inline because that would block the
+event loop for every other request.  Instead clients ``POST /jobs`` with a job
+``kind`` and the shapes to process; the work is handed to a bounded
+:class:`~concurrent.futures.ProcessPoolExecutor` and the client polls
+``GET /jobs/{job_id}`` until the result is available.
+
+Shapes are shipped to workers as packed vertex/offset arrays (see
+:func:`daiku.geo.shape.pack_shapes`) rather than pickled ``V2D`` graphs.  A
+job's id is the hash of its kind, parameters and packed input, so identical
+submissions share one job and its cached result.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+import numpy as np
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+from daiku.geo.base import V2D
+from daiku.geo.offset import DEFAULT_TOLERANCE, offset_packed
+from daiku.geo.shape import pack_shapes, shape_areas, shape_bounds, shape_perimeters
+
+if TYPE_CHECKING:  # pragma: no cover
+    from concurrent.futures import ProcessPoolExecutor
+
+MAX_WORKERS = int(os.getenv("DAIKU_JOB_WORKERS", "0")) or os.cpu_count() or 1
+MAX_PENDING = int(os.getenv("DAIKU_JOB_MAX_PENDING", str(4 * MAX_WORKERS)))
+MAX_JOBS = int(os.getenv("DAIKU_JOB_CACHE_SIZE", "256"))
+
+
+# Job kinds -------------------------------------------------------------------
+#
+# Each kind receives the packed ``vertices``/``offsets`` arrays plus the
+# request's ``params`` dict and returns a JSON serialisable result.  They run
+# in worker processes and must therefore be module level functions.
+
+def _shape_metrics(vertices: np.ndarray, offsets: np.ndarray, params: dict) -> dict:
+    bounds = shape_bounds(vertices, offsets)
+    return {
+        "area": shape_areas(vertices, offsets).tolist(),
+        "perimeter": shape_perimeters(vertices, offsets).tolist(),
+        "bounds": [None if np.isnan(b[0]) else b.tolist() for b in bounds],
+    }
+
+
+def _offset(vertices: np.ndarray, offsets: np.ndarray, params: dict) -> dict:
+    out, out_offsets, source = offset_packed(
+        vertices,
+        offsets,
+        params["distance"],
+        params["tolerance"],
+    )
+    return {
+        "shapes": [
+            [{"x": x, "y": y} for x, y in out[out_offsets[i]:out_offsets[i + 1]].tolist()]
+            for i in range(len(source))
+        ],
+        "source": source.tolist(),
+    }
+
+
+JOB_KINDS: Dict[str, Callable[[np.ndarray, np.ndarray, dict], dict]] = {
+    "shape_metrics": _shape_metrics,
+    "offset": _offset,
+}
+
+
+# Parameter checks run in the handler, so bad input is a 400 rather than a
+# failed job.  They raise ``ValueError`` and return the normalised params.
+
+def _finite(value: Any, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{name} must be a number")
+    try:
+        number = float(value)
+    except OverflowError:
+        number = math.inf
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be finite")
+    return number
+
+
+def _no_params(params: dict) -> dict:
+    return {}
+
+
+def _offset_params(params: dict) -> dict:
+    distance = _finite(params.get("distance"), "distance")
+    tolerance = _finite(params.get("tolerance", DEFAULT_TOLERANCE), "tolerance")
+    if tolerance <= 0:
+        raise ValueError("tolerance must be positive")
+    return {"distance": distance, "tolerance": tolerance}
+
+
+JOB_PARAMS: Dict[str, Callable[[dict], dict]] = {
+    "shape_metrics": _no_params,
+    "offset": _offset_params,
+}
+
+
+def _run(kind: str, vertices: np.ndarray, offsets: np.ndarray, params: dict) -> dict:
+    return JOB_KINDS[kind](vertices, offsets, params)
+
+
+# Job registry ----------------------------------------------------------------
+
+@dataclass
+class Job:
+    gid: str
+    kind: str
+    future: Future
+    cancelled: bool = False
+
+    @property
+    def status(self) -> str:
+        if self.cancelled or self.future.cancelled():
+            return "cancelled"
+        if self.future.running():
+            return "running"
+        if not self.future.done():
+            return "pending"
+        return "failed" if self.future.exception() is not None else "done"
+
+    def to_dict(self) -> dict:
+        data = {"gid": self.gid, "kind": self.kind, "status": self.status}
+        if data["status"] == "failed":
+            data["error"] = str(self.future.exception())
+        return data
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+
+def executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Imported lazily: multiprocessing adds noticeably to start up time.
+        from concurrent.futures import ProcessPoolExecutor
+
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _executor
+
+
+def _submit(*args) -> Future:
+    # Imported lazily for the same reason as the pool itself.
+    from concurrent.futures.process import BrokenProcessPool
+
+    try:
+        return executor().submit(*args)
+    except BrokenProcessPool:
+        # A worker died abruptly (e.g. killed for using too much memory) and
+        # the pool refuses all further work; start a fresh one.
+        shutdown_jobs()
+        return executor().submit(*args)
+
+
+def shutdown_jobs() -> None:
+    """Stop the worker pool, cancelling anything that has not started."""
+
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _input_hash(kind: str, params: dict, vertices: np.ndarray, offsets: np.ndarray) -> str:
+    digest = hashlib.sha256()
+    digest.update(kind.encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    digest.update(vertices.tobytes())
+    digest.update(offsets.tobytes())
+    return digest.hexdigest()
+
+
+def _evict() -> None:
+    finished = [gid for gid, job in jobs.items() if job.future.done() or job.cancelled]
+    for gid in finished[: max(0, len(jobs) - MAX_JOBS)]:
+        del jobs[gid]
+
+
+def _get_job(job_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+# API endpoints -------------------------------------------------------------
+
+async def submit_job(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Job must be a JSON object")
+    kind = data.get("kind")
+    if not isinstance(kind, str) or kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {kind!r}")
+    params = data.get("params", {})
+    if not isinstance(params, dict):
+        raise HTTPException(status_code=400, detail="Job params must be a JSON object")
+    try:
+        params = JOB_PARAMS[kind](params)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid params: {exc}")
+    try:
+        shapes = [
+            [V2D(_finite(p["x"], "x"), _finite(p["y"], "y")) for p in shape]
+            for shape in data.get("shapes", [])
+        ]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid shapes")
+    vertices, offsets = pack_shapes(shapes)
+    gid = _input_hash(kind, params, vertices, offsets)
+
+    job = jobs.get(gid)
+    if job is not None and job.status in ("pending", "running", "done"):
+        jobs.move_to_end(gid)
+        return JSONResponse(job.to_dict(), status_code=202)
+
+    pending = sum(1 for j in jobs.values() if not j.future.done())
+    if pending >= MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Job queue is full")
+    future = _submit(_run, kind, vertices, offsets, params)
+    job = Job(gid, kind, future)
+    jobs[gid] = job
+    jobs.move_to_end(gid)
+    _evict()
+    return JSONResponse(job.to_dict(), status_code=202)
+
+
+async def get_job(request):
+    job = _get_job(request.path_params["job_id"])
+    return JSONResponse(job.to_dict())
+
+
+async def get_job_result(request):
+    job = _get_job(request.path_params["job_id"])
+    status = job.status
+    if status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {status}")
+    jobs.move_to_end(job.gid)
+    return JSONResponse(job.future.result())
+
+
+async def cancel_job(request):
+    job = _get_job(request.path_params["job_id"])
+    if not job.future.done():
+        # A running job cannot be interrupted; its result is discarded.
+        job.future.cancel()
+        job.cancelled = True
+    return JSONResponse(job.to_dict())
@@ -0,0 +1,199 @@
+"""Write-behind buffering for DynamoDB items.
+
+Editors autosave by re-posting the same plane many times a second.  Rather
+than issuing a ``put_item`` for every post, :class:`WriteBehindBuffer` keeps
+only the latest item per table and ``gid`` and hands the coalesced set to a
+flush callback, either every ``interval`` seconds or as soon as
+``max_items`` distinct items are pending.  Reads should consult
+:meth:`WriteBehindBuffer.get` first so clients see their own writes before
+they reach the database.
+
+A failed flush keeps its items buffered, logs the error and is retried with
+exponential backoff up to ``max_backoff`` seconds.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from typing import Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# table name -> gid -> item
+Batch = Dict[str, Dict[str, dict]]
+
+
+class WriteBehindBuffer:
+    """Coalesce item writes and persist them in batches.
+
+    Parameters
+    ----------
+    write:
+        Callable persisting a batch.  It runs in a worker thread; if it
+        raises, items that have not been superseded in the meantime are put
+        back into the buffer.
+    interval:
+        Maximum time in seconds a write stays buffered.
+    max_items:
+        Number of pending items that triggers an early flush.
+    max_backoff:
+        Upper bound in seconds for the delay between failed flushes.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[Batch], None],
+        interval: float = 0.25,
+        max_items: int = 25,
+        max_backoff: float = 30.0,
+    ):
+        self.write = write
+        self.interval = interval
+        self.max_items = max_items
+        self.max_backoff = max_backoff
+        # Consecutive failed background flushes.
+        self.failures = 0
+        self._pending: Batch = {}
+        self._flushing: Batch = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Background flush currently running; it outlives a cancelled task.
+        self._inflight: Optional[asyncio.Future] = None
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._pending.values())
+
+    def put(self, table: str, item: dict) -> None:
+        """Buffer ``item``, replacing any pending write with the same gid."""
+
+        self._pending.setdefault(table, {})[item["gid"]] = item
+        self._ensure_task()
+        if self._wake is not None and len(self) >= self.max_items:
+            self._wake.set()
+
+    def get(self, table: str, gid: str) -> Optional[dict]:
+        """Return the latest unpersisted item for ``gid`` if there is one."""
+
+        item = self._pending.get(table, {}).get(gid)
+        if item is None:
+            item = self._flushing.get(table, {}).get(gid)
+        return item
+
+    def flush(self) -> None:
+        """Synchronously persist everything that is pending."""
+
+        batch = self._take()
+        try:
+            self._write(batch)
+        except Exception:
+            self._requeue(batch)
+            raise
+        finally:
+            self._flushing = {}
+
+    async def aflush(self) -> None:
+        """Persist everything pending without blocking the event loop."""
+
+        batch = self._take()
+        try:
+            await run_in_threadpool(self._write, batch)
+        except Exception:
+            self._requeue(batch)
+            raise
+        finally:
+            self._flushing = {}
+
+    async def start(self) -> None:
+        self._ensure_task()
+
+    async def stop(self, attempts: int = 3) -> None:
+        """Stop the background flusher and persist what is left.
+
+        Gives up after ``attempts`` failed flushes in a row; whatever is
+        still buffered then is logged and lost.
+        """
+
+        task, self._task = self._task, None
+        self._wake = None
+        if task is not None and not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        inflight, self._inflight = self._inflight, None
+        if inflight is not None:
+            # A failed write puts its items back for the drain below.
+            with contextlib.suppress(Exception):
+                await inflight
+        failed = 0
+        while len(self):
+            try:
+                await self.aflush()
+            except Exception:
+                failed += 1
+                if failed >= attempts:
+                    logger.exception("Giving up on %d buffered writes", len(self))
+                    return
+                await asyncio.sleep(self._backoff(failed))
+
+    # Internals ---------------------------------------------------------
+    def _take(self) -> Batch:
+        # Swapping happens on the caller's thread so concurrent ``put`` calls
+        # always land in the new pending batch.
+        batch, self._pending = self._pending, {}
+        self._flushing = batch
+        return batch
+
+    def _write(self, batch: Batch) -> None:
+        if batch:
+            self.write(batch)
+
+    def _requeue(self, batch: Batch) -> None:
+        # Writes made while the batch was in flight are newer and win.
+        for table, items in batch.items():
+            pending = self._pending.setdefault(table, {})
+            for gid, item in items.items():
+                pending.setdefault(gid, item)
+
+    def _ensure_task(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._wake = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def _backoff(self, failures: int) -> float:
+        return min(self.interval * 2 ** failures, self.max_backoff)
+
+    async def _run(self) -> None:
+        while True:
+            if self.failures:
+                # Filling up the buffer must not cut a backoff short.
+                await asyncio.sleep(self._backoff(self.failures))
+            else:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), self.interval)
+            self._wake.clear()
+            if not len(self):
+                continue
+            # Shielded so that stopping waits for the write instead of
+            # forgetting a batch that is already on its way.
+            self._inflight = asyncio.ensure_future(self.aflush())
+            try:
+                await asyncio.shield(self._inflight)
+            except Exception:
+                self.failures += 1
+                logger.exception(
+                    "Write-behind flush failed %d time(s) in a row; %d items buffered, retrying in %.2fs",
+                    self.failures,
+                    len(self),
+                    self._backoff(self.failures),
+                )
+            else:
+                self.failures = 0
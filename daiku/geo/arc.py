@@ -4,8 +4,12 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
 import math
+from typing import List, Sequence, Tuple
+
+import numpy as np
 
 from daiku.geo.base import GeoBase, V3D
+from daiku.geo.line import Line
 
 
 class ArcDirection(str, Enum):
@@ -204,3 +208,213 @@ class Arc(GeoBase):
         """Construct an :class:`Arc` from two end points and a radius."""
 
         return cls(gid, EndpointsArcConfig(start, end, radius, direction))
+
+    # Queries -----------------------------------------------------------
+    @property
+    def sweep(self) -> float:
+        """Signed sweep angle, positive for counter‑clockwise arcs."""
+
+        return float(self.packed()[0, 4])
+
+    def packed(self) -> np.ndarray:
+        """This arc as a single row of :func:`pack_arcs`."""
+
+        return pack_arcs([self])
+
+    def length(self) -> float:
+        return float(arc_lengths(self.packed())[0])
+
+    def bounds(self) -> Tuple[float, float, float, float]:
+        """Tight ``(xmin, ymin, xmax, ymax)`` box around the arc."""
+
+        return tuple(arc_bounds(self.packed())[0].tolist())
+
+    def closest_point(self, point: V3D) -> V3D:
+        closest, _ = arc_closest_points(self.packed(), point.x, point.y)
+        return V3D(float(closest[0, 0]), float(closest[0, 1]), self.center.z)
+
+    def distance(self, point: V3D) -> float:
+        _, dist = arc_closest_points(self.packed(), point.x, point.y)
+        return float(dist[0])
+
+    def intersect_line(self, line: Line) -> List[V3D]:
+        """Points where the segment ``line`` crosses this arc."""
+
+        points, valid = arc_line_intersections(
+            self.packed(), (line.s.x, line.s.y), (line.e.x, line.e.y)
+        )
+        return [V3D(float(x), float(y), self.center.z) for x, y in points[0][valid[0]]]
+
+    def intersect_arc(self, other: "Arc") -> List[V3D]:
+        """Points shared by this arc and ``other``."""
+
+        points, valid = arc_arc_intersections(self.packed(), other.packed()[0])
+        return [V3D(float(x), float(y), self.center.z) for x, y in points[0][valid[0]]]
+
+
+# ---------------------------------------------------------------------------
+# Vectorized queries
+# ---------------------------------------------------------------------------
+#
+# Arcs are packed into ``(n, 5)`` float arrays with the columns
+# ``cx, cy, radius, start_angle, sweep``.  ``sweep`` is signed: positive for
+# counter‑clockwise arcs and negative for clockwise ones.  An arc whose end
+# angle differs from its start angle by a whole number of turns is a full
+# circle; identical start and end angles give a zero length arc.
+
+_TWO_PI = 2 * math.pi
+_ANGLE_EPS = 1.0e-12
+
+
+def pack_arcs(arcs: Sequence[Arc]) -> np.ndarray:
+    """Pack ``arcs`` into an ``(n, 5)`` array for the vectorized queries."""
+
+    raw = np.array(
+        [
+            (a.center.x, a.center.y, a.radius, a.start_angle, a.end_angle,
+             a.direction is ArcDirection.CCW)
+            for a in arcs
+        ],
+        dtype=float,
+    ).reshape(-1, 6)
+    start, end, ccw = raw[:, 3], raw[:, 4], raw[:, 5].astype(bool)
+    delta = np.where(ccw, end - start, start - end)
+    sweep = np.mod(delta, _TWO_PI)
+    sweep[(sweep == 0) & (delta != 0)] = _TWO_PI
+    out = raw[:, :5].copy()
+    out[:, 4] = np.where(ccw, sweep, -sweep)
+    return out
+
+
+def _ccw_form(arcs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start angle and non‑negative sweep of the equivalent CCW arcs."""
+
+    sweep = arcs[:, 4]
+    start = np.where(sweep < 0, arcs[:, 3] + sweep, arcs[:, 3])
+    return start, np.abs(sweep)
+
+
+def _on_sweep(arcs: np.ndarray, angle: np.ndarray) -> np.ndarray:
+    """Whether ``angle`` (broadcast against the arcs) lies on each arc."""
+
+    start, sweep = _ccw_form(arcs)
+    if angle.ndim > 1:
+        start, sweep = start[:, None], sweep[:, None]
+    offset = np.mod(angle - start, _TWO_PI)
+    return (offset <= sweep + _ANGLE_EPS) | (offset >= _TWO_PI - _ANGLE_EPS)
+
+
+def _endpoints(arcs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    cx, cy, r, a0, sweep = arcs.T
+    a1 = a0 + sweep
+    start = np.stack([cx + r * np.cos(a0), cy + r * np.sin(a0)], axis=-1)
+    end = np.stack([cx + r * np.cos(a1), cy + r * np.sin(a1)], axis=-1)
+    return start, end
+
+
+def arc_lengths(arcs: np.ndarray) -> np.ndarray:
+    return arcs[:, 2] * np.abs(arcs[:, 4])
+
+
+def arc_bounds(arcs: np.ndarray) -> np.ndarray:
+    """Tight bounding boxes as ``(n, 4)`` rows of ``xmin, ymin, xmax, ymax``.
+
+    Besides the end points, the extreme points at 0, π/2, π and 3π/2 are
+    included for every arc whose sweep crosses them.
+    """
+
+    cx, cy, r = arcs[:, 0], arcs[:, 1], arcs[:, 2]
+    start, end = _endpoints(arcs)
+    axes = np.array([0.0, 0.5, 1.0, 1.5]) * math.pi
+    crosses = _on_sweep(arcs, np.broadcast_to(axes, (len(arcs), 4)))
+    xmin = np.minimum(start[:, 0], end[:, 0])
+    xmax = np.maximum(start[:, 0], end[:, 0])
+    ymin = np.minimum(start[:, 1], end[:, 1])
+    ymax = np.maximum(start[:, 1], end[:, 1])
+    xmax = np.where(crosses[:, 0], cx + r, xmax)
+    ymax = np.where(crosses[:, 1], cy + r, ymax)
+    xmin = np.where(crosses[:, 2], cx - r, xmin)
+    ymin = np.where(crosses[:, 3], cy - r, ymin)
+    return np.stack([xmin, ymin, xmax, ymax], axis=-1)
+
+
+def arc_closest_points(arcs: np.ndarray, x, y) -> Tuple[np.ndarray, np.ndarray]:
+    """Closest point on every arc to ``(x, y)`` and its distance.
+
+    Returns an ``(n, 2)`` array of points and an ``(n,)`` array of distances.
+    """
+
+    cx, cy, r = arcs[:, 0], arcs[:, 1], arcs[:, 2]
+    angle = np.arctan2(y - cy, x - cx)
+    on_circle = np.stack([cx + r * np.cos(angle), cy + r * np.sin(angle)], axis=-1)
+    start, end = _endpoints(arcs)
+    query = np.array([x, y], dtype=float)
+    d_start = np.hypot(*(start - query).T)
+    d_end = np.hypot(*(end - query).T)
+    endpoint = np.where((d_start <= d_end)[:, None], start, end)
+    closest = np.where(_on_sweep(arcs, angle)[:, None], on_circle, endpoint)
+    return closest, np.hypot(*(closest - query).T)
+
+
+def arc_line_intersections(arcs: np.ndarray, p0, p1) -> Tuple[np.ndarray, np.ndarray]:
+    """Intersections of every arc with the segment ``p0``–``p1``.
+
+    Returns ``(points, valid)`` where ``points`` has shape ``(n, 2, 2)`` and
+    ``valid`` marks which of the two candidate points of each arc exist.
+    """
+
+    cx, cy, r = arcs[:, 0], arcs[:, 1], arcs[:, 2]
+    x0, y0 = float(p0[0]), float(p0[1])
+    dx, dy = float(p1[0]) - x0, float(p1[1]) - y0
+    a = dx * dx + dy * dy
+    fx, fy = x0 - cx, y0 - cy
+    b = 2 * (fx * dx + fy * dy)
+    c = fx * fx + fy * fy - r * r
+    disc = b * b - 4 * a * c
+    root = np.sqrt(np.maximum(disc, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.stack([(-b - root) / (2 * a), (-b + root) / (2 * a)], axis=-1)
+    points = np.stack([x0 + t * dx, y0 + t * dy], axis=-1)
+    angle = np.arctan2(points[..., 1] - cy[:, None], points[..., 0] - cx[:, None])
+    valid = (
+        (a > 0)
+        & (disc >= 0)[:, None]
+        & (t >= -_ANGLE_EPS)
+        & (t <= 1 + _ANGLE_EPS)
+        & _on_sweep(arcs, angle)
+    )
+    # A tangent line touches once; drop the duplicate root.
+    valid[:, 1] &= disc > 0
+    return points, valid
+
+
+def arc_arc_intersections(arcs: np.ndarray, other: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Intersections of every arc with the single packed arc ``other``.
+
+    Returns ``(points, valid)`` shaped like :func:`arc_line_intersections`.
+    Arcs on the same circle overlap rather than intersect and yield no points.
+    """
+
+    cx, cy, r = arcs[:, 0], arcs[:, 1], arcs[:, 2]
+    ox, oy, orad = float(other[0]), float(other[1]), float(other[2])
+    dx, dy = ox - cx, oy - cy
+    d = np.hypot(dx, dy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        along = (d * d + r * r - orad * orad) / (2 * d)
+        h2 = r * r - along * along
+        h = np.sqrt(np.maximum(h2, 0.0))
+        mx, my = cx + along * dx / d, cy + along * dy / d
+        px, py = -dy / d * h, dx / d * h
+    points = np.stack(
+        [np.stack([mx + px, my + py], axis=-1), np.stack([mx - px, my - py], axis=-1)],
+        axis=1,
+    )
+    angle = np.arctan2(points[..., 1] - cy[:, None], points[..., 0] - cx[:, None])
+    other_angle = np.arctan2(points[..., 1] - oy, points[..., 0] - ox)
+    valid = (
+        ((d > 0) & (h2 >= -_ANGLE_EPS * r * r))[:, None]
+        & _on_sweep(arcs, angle)
+        & _on_sweep(np.broadcast_to(other, arcs.shape), other_angle)
+    )
+    valid[:, 1] &= h > 0
+    return points, valid
@@ -0,0 +1,85 @@
+"""Uniform grids over segments.
+
+Both the spatial index of a plane (:mod:`daiku.parts.index`) and the
+self-intersection search of :mod:`daiku.geo.offset` bucket segments into a
+grid of square cells.  :func:`segment_cells` walks every segment through the
+cells it actually crosses, in the manner of a DDA line rasteriser, rather
+than registering it in every cell of its bounding box: a long diagonal
+touches ``O(n)`` cells of an ``n`` by ``n`` grid instead of ``O(n²)``.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+import numpy as np
+
+
+def grid_shape(lo: np.ndarray, hi: np.ndarray, cell: float) -> Tuple[int, int]:
+    """Number of columns and rows of ``cell`` sized squares covering ``lo``–``hi``."""
+
+    nx, ny = (np.floor((hi - lo) / cell).astype(np.int64) + 1).tolist()
+    return nx, ny
+
+
+def segment_cells(
+    segments: np.ndarray, origin: np.ndarray, cell: float, shape: Tuple[int, int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Cells crossed by each of ``segments``.
+
+    Parameters
+    ----------
+    segments:
+        ``(m, 4)`` array of ``x0, y0, x1, y1`` rows.
+    origin:
+        Lower left corner of the grid.
+    cell:
+        Side of a cell.
+    shape:
+        Number of columns and rows; cells outside are clamped to the border.
+
+    Returns
+    -------
+    segment, cx, cy:
+        One entry per segment and cell it passes through, sorted by segment.
+    """
+
+    m = len(segments)
+    g = (np.asarray(segments, dtype=float).reshape(-1, 2) - origin) / cell
+    g0, g1 = g[0::2], g[1::2]
+    d = g1 - g0
+    f0 = np.floor(g0)
+    first = np.minimum(f0, np.floor(g1))
+    crossings = np.abs(np.floor(g1) - f0).astype(np.int64)
+
+    # Parameters along each segment where it enters a new cell: its start
+    # and every grid line it crosses.
+    ts = [np.zeros(m)]
+    owners = [np.arange(m)]
+    for axis in (0, 1):
+        k = crossings[:, axis]
+        seg = np.repeat(np.arange(m), k)
+        line = first[seg, axis] + 1 + np.arange(len(seg)) - np.repeat(np.cumsum(k) - k, k)
+        ts.append(np.clip((line - g0[seg, axis]) / d[seg, axis], 0.0, 1.0))
+        owners.append(seg)
+    t = np.concatenate(ts)
+    seg = np.concatenate(owners)
+    order = np.lexsort((t, seg))
+    t, seg = t[order], seg[order]
+
+    # Each stretch between consecutive parameters lies in a single cell; its
+    # midpoint tells which.
+    end = np.append(t[1:], 1.0)
+    end[np.append(seg[1:] != seg[:-1], True)] = 1.0
+    mid = (t + end) / 2
+    cells = np.floor(g0[seg] + mid[:, None] * d[seg]).astype(np.int64)
+    cells = np.clip(cells, 0, np.array(shape) - 1)
+
+    # Empty stretches, where a segment passes exactly through a corner or
+    # ends on a grid line, merely touch their cell.  Clamping to the border
+    # may repeat a cell.
+    solid = end > t
+    seg, cells = seg[solid], cells[solid]
+    keep = np.ones(len(seg), dtype=bool)
+    keep[1:] = (seg[1:] != seg[:-1]) | np.any(cells[1:] != cells[:-1], axis=1)
+    return seg[keep], cells[keep, 0], cells[keep, 1]
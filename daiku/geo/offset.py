@@ -0,0 +1,407 @@
+"""Offsetting closed shapes by a tool radius.
+
+Cutting a shape requires the tool centre to follow a path offset from the
+shape by the tool radius: outwards for profiles and inwards for pockets.
+:func:`offset_packed` offsets every shape of a packed vertex array (see
+:func:`daiku.geo.shape.pack_shapes`) in one pass:
+
+1. Every edge is moved along its outward normal.
+2. Where consecutive offset edges open a gap, the gap is bridged by an arc
+   around the original vertex, tessellated so that no chord strays more than
+   ``tolerance`` from the true arc.
+3. The resulting raw ring is split at all of its self-intersections at once,
+   found through a segment grid (:mod:`daiku.geo.grid`), and only the
+   counter‑clockwise loops around which the raw ring winds exactly once
+   are kept: these bound the region the offset tool path encloses.
+
+Output rings are always counter‑clockwise.  A shape may produce no ring (a
+pocket narrower than the tool) or several (a pocket that pinches apart).
+
+:func:`offset_shapes` wraps this for ``V2D`` shapes and caches the result per
+shape hash, distance and tolerance because every tool change re-offsets the
+same geometry.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import math
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from daiku.geo.base import V2D
+from daiku.geo.grid import grid_shape, segment_cells
+from daiku.geo.shape import next_vertex, pack_shape, shape_areas, shape_hash, unpack_shape
+
+DEFAULT_TOLERANCE = 0.01
+CACHE_SIZE = int(os.getenv("DAIKU_OFFSET_CACHE_SIZE", "4096"))
+
+_EPS = 1.0e-12
+# Candidate segment pairs tested at once when looking for crossings.
+_PAIRS_PER_CHUNK = 1 << 18
+
+
+def _normalise(vertices: np.ndarray, offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Make every shape counter‑clockwise and drop repeated vertices.
+
+    Shapes left with fewer than three vertices or no area become empty.
+    """
+
+    counts = np.diff(offsets)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    idx = np.arange(len(vertices))
+    flip = (shape_areas(vertices, offsets) < 0)[owner]
+    start, end = offsets[:-1][owner], offsets[1:][owner]
+    vertices = vertices[np.where(flip, start + end - 1 - idx, idx)]
+
+    keep = np.any(vertices != vertices[next_vertex(offsets)], axis=1)
+    counts = np.bincount(owner[keep], minlength=len(counts))
+    vertices = vertices[keep]
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    # Drop degenerate shapes entirely.
+    degenerate = (counts < 3) | (np.abs(shape_areas(vertices, offsets)) <= _EPS)
+    if degenerate.any():
+        owner = np.repeat(np.arange(len(counts)), counts)
+        vertices = vertices[~degenerate[owner]]
+        counts = np.where(degenerate, 0, counts)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+    return vertices, offsets
+
+
+def _raw_offset(
+    vertices: np.ndarray, offsets: np.ndarray, distance: float, tolerance: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Offset edges and corner arcs of all shapes, without any cleanup."""
+
+    nxt = next_vertex(offsets)
+    edge = vertices[nxt] - vertices
+    unit = edge / np.hypot(*edge.T)[:, None]
+    normal = np.stack([unit[:, 1], -unit[:, 0]], axis=1)
+    a = vertices + distance * normal
+    b = vertices[nxt] + distance * normal
+
+    # Joint between edge ``i`` and the following edge, around vertex nxt[i].
+    follow = unit[nxt]
+    cross = unit[:, 0] * follow[:, 1] - unit[:, 1] * follow[:, 0]
+    turn = np.arctan2(cross, np.einsum("ij,ij->i", unit, follow))
+    step = 2 * math.acos(max(1 - tolerance / abs(distance), -1.0)) if distance else math.pi
+    needs_arc = cross * distance > _EPS
+    k = np.where(needs_arc, np.maximum(np.ceil(np.abs(turn) / max(step, _EPS)) - 1, 0), 0)
+    k = k.astype(np.int64)
+
+    sizes = 2 + k
+    pos = np.cumsum(sizes) - sizes
+    out = np.empty((int(sizes.sum()), 2))
+    out[pos] = a
+    out[pos + 1] = b
+    rep = np.repeat(np.arange(len(vertices)), k)
+    j = np.arange(len(rep)) - np.repeat(np.cumsum(k) - k, k) + 1
+    theta = np.arctan2(normal[rep, 1], normal[rep, 0]) + turn[rep] * j / (k[rep] + 1)
+    out[pos[rep] + 1 + j] = vertices[nxt[rep]] + distance * np.stack(
+        [np.cos(theta), np.sin(theta)], axis=1
+    )
+
+    counts = np.diff(offsets)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    out_counts = np.bincount(owner, weights=sizes, minlength=len(counts)).astype(np.int64)
+    return out, np.concatenate([[0], np.cumsum(out_counts)])
+
+
+def _crossings(ring: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """All proper crossings between non‑adjacent segments of ``ring``.
+
+    Segments are bucketed into a grid with cells about as long as the mean
+    segment, so only segments in the same or neighbouring cells are tested
+    against each other.
+
+    Returns
+    -------
+    i, j, t, s:
+        Segment ``i`` crosses segment ``j > i`` at parameter ``t`` along
+        ``i`` and ``s`` along ``j``.
+    """
+
+    m = len(ring)
+    empty = (np.zeros(0, dtype=np.int64),) * 2 + (np.zeros(0),) * 2
+    if m < 4:
+        return empty
+    d = np.roll(ring, -1, axis=0) - ring
+    segs = np.concatenate([ring, ring + d], axis=1)
+    lo, hi = ring.min(axis=0), ring.max(axis=0)
+    extent = float((hi - lo).max())
+    # Cells are only ever addressed through sorted keys, so the grid may be
+    # as fine as the segments; the floor keeps keys well inside int64.
+    cell = max(float(np.hypot(*d.T).mean()), extent / (1 << 20)) or 1.0
+    shape = grid_shape(lo, hi, cell)
+    seg, cx, cy = segment_cells(segs, lo, cell, shape)
+
+    # Segments crossing inside a cell, or on its border, share that cell or
+    # sit in neighbouring ones.  An empty padding column keeps the offsets
+    # of the neighbours from wrapping to the next row.
+    width = shape[0] + 1
+    key = cy * width + cx
+    order = np.argsort(key, kind="stable")
+    key, seg = key[order], seg[order]
+    found = []
+    for step in (0, 1, width - 1, width, width + 1):
+        # Within a cell only entries after this one are paired with it.
+        start = np.arange(1, len(key) + 1) if step == 0 else np.searchsorted(key, key + step, side="left")
+        count = np.searchsorted(key, key + step, side="right") - start
+        # Crowded cells pair up quadratically, so bound the pairs in memory.
+        total = np.cumsum(count)
+        bounds = np.searchsorted(total, np.arange(0, int(total[-1]), _PAIRS_PER_CHUNK), side="right")
+        for begin, stop in zip(bounds, np.append(bounds[1:], len(key))):
+            c = count[begin:stop]
+            rep = np.repeat(np.arange(begin, stop), c)
+            other = seg[np.arange(len(rep)) - np.repeat(np.cumsum(c) - c, c) + start[rep]]
+            found.append(_crossing_pairs(ring, d, seg[rep], other))
+    i, j, t, s = (np.concatenate(parts) for parts in zip(*found)) if found else empty
+    # Pairs sharing several cells are found more than once.
+    _, first = np.unique(i * m + j, return_index=True)
+    return i[first], j[first], t[first], s[first]
+
+
+def _crossing_pairs(
+    ring: np.ndarray, d: np.ndarray, a: np.ndarray, b: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Which of the segment pairs ``a``, ``b`` of ``ring`` properly cross."""
+
+    m = len(ring)
+    i, j = np.minimum(a, b), np.maximum(a, b)
+    near = (j > i + 1) & ~((i == 0) & (j == m - 1))
+    i, j = i[near], j[near]
+    denom = d[i, 0] * d[j, 1] - d[i, 1] * d[j, 0]
+    diff = ring[j] - ring[i]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (diff[:, 0] * d[j, 1] - diff[:, 1] * d[j, 0]) / denom
+        s = (diff[:, 0] * d[i, 1] - diff[:, 1] * d[i, 0]) / denom
+    hit = (
+        (np.abs(denom) > _EPS)
+        & (t > _EPS) & (t < 1 - _EPS)
+        & (s > _EPS) & (s < 1 - _EPS)
+    )
+    return i[hit], j[hit], t[hit], s[hit]
+
+
+def _split_loops(ring: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Split ``ring`` at all of its self‑intersections at once.
+
+    Every crossing point is inserted into both segments it lies on, giving
+    an augmented ring.  At each crossing the two paths through it swap
+    continuations, which turns the ring into simple loops that touch but no
+    longer cross.
+
+    Returns
+    -------
+    points, following, loops, offsets:
+        Points of the augmented ring, the index of the point following each
+        one after the swaps, and indices into ``points`` of every loop in
+        order, packed like shapes with ``offsets``.
+    """
+
+    m = len(ring)
+    i, j, t, s = _crossings(ring)
+    k = len(i)
+    crossing = ring[i] + t[:, None] * (np.roll(ring, -1, axis=0)[i] - ring[i])
+
+    # Each crossing occurs on segment i and on segment j.
+    seg = np.concatenate([i, j])
+    param = np.concatenate([t, s])
+    order = np.lexsort((param, seg))
+    before = np.searchsorted(seg[order], np.arange(m), side="left")
+    vertex_pos = np.arange(m) + before
+    occurrence_pos = np.empty(2 * k, dtype=np.int64)
+    occurrence_pos[order] = vertex_pos[seg[order]] + 1 + np.arange(2 * k) - before[seg[order]]
+
+    size = m + 2 * k
+    points = np.empty((size, 2))
+    points[vertex_pos] = ring
+    points[occurrence_pos] = np.concatenate([crossing, crossing])
+    following = (np.arange(size) + 1) % size
+    on_i, on_j = occurrence_pos[:k], occurrence_pos[k:]
+    following[on_i] = (on_j + 1) % size
+    following[on_j] = (on_i + 1) % size
+
+    # Pointer jumping: label every point with the smallest index on its
+    # loop, then count how many steps it is from the loop's last point.
+    label = np.arange(size)
+    jump = following
+    for _ in range(max(size - 1, 1).bit_length()):
+        label = np.minimum(label, label[jump])
+        jump = jump[jump]
+    last = following == label
+    jump = np.where(last, np.arange(size), following)
+    steps = (~last).astype(np.int64)
+    for _ in range(max(size - 1, 1).bit_length()):
+        steps = steps + steps[jump]
+        jump = jump[jump]
+    loops = np.lexsort((-steps, label))
+    starts = np.flatnonzero(np.diff(label[loops], prepend=-1))
+    return points, following, loops, np.append(starts, size)
+
+
+def _winding(points: np.ndarray, following: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Winding number of the ring just left of the midpoint of each edge.
+
+    ``edges`` indexes ``points``; the edge from ``points[e]`` to
+    ``points[following[e]]`` is the ring edge starting at ``e``.  Winding
+    numbers are counted along a ray towards ``+x``, and only edges in the
+    same horizontal band as the ray's origin can cross it.
+    """
+
+    a, b = points, points[following]
+    q = (a[edges] + b[edges]) / 2
+    # A point just left of an upward edge sees it on the ray; one just left
+    # of a downward edge does not.
+    own = (b[edges, 1] > a[edges, 1]).astype(np.int64)
+
+    lo = np.minimum(a[:, 1], b[:, 1])
+    hi = np.maximum(a[:, 1], b[:, 1])
+    y0 = float(lo.min())
+    height = max((float(hi.max()) - y0) / max(math.sqrt(len(points)), 1.0), _EPS)
+    first = np.floor((lo - y0) / height).astype(np.int64)
+    rows = np.floor((hi - y0) / height).astype(np.int64) - first + 1
+    edge = np.repeat(np.arange(len(points)), rows)
+    band = first[edge] + np.arange(len(edge)) - np.repeat(np.cumsum(rows) - rows, rows)
+    order = np.argsort(band, kind="stable")
+    band, edge = band[order], edge[order]
+
+    qband = np.floor((q[:, 1] - y0) / height).astype(np.int64)
+    start = np.searchsorted(band, qband, side="left")
+    count = np.searchsorted(band, qband, side="right") - start
+    query = np.repeat(np.arange(len(q)), count)
+    e = edge[np.arange(len(query)) - np.repeat(np.cumsum(count) - count, count) + start[query]]
+    keep = e != edges[query]
+    query, e = query[keep], e[keep]
+
+    qx, qy = q[query].T
+    ax, ay = a[e].T
+    bx, by = b[e].T
+    side = (bx - ax) * (qy - ay) - (by - ay) * (qx - ax)
+    up = (ay <= qy) & (qy < by) & (side > 0)
+    down = (by <= qy) & (qy < ay) & (side < 0)
+    return own + np.bincount(query, weights=up.astype(np.int64) - down, minlength=len(q)).astype(np.int64)
+
+
+def _clean(raw: np.ndarray, scale: float) -> List[np.ndarray]:
+    """Loops of ``raw`` bounding the region it winds around at least once.
+
+    After splitting, a loop lies on that boundary exactly when it runs
+    counter‑clockwise with a winding number of one on its left.  Clockwise
+    loops are the inverted swallowtails and collapsed parts, so only the
+    few others need the winding number.
+    """
+
+    keep = np.any(raw != np.roll(raw, -1, axis=0), axis=1)
+    points, following, loops, offsets = _split_loops(raw[keep])
+    counts = np.diff(offsets)
+    candidates = np.flatnonzero(
+        (counts >= 3) & (shape_areas(points[loops], offsets) > _EPS * scale * scale)
+    )
+    if not len(candidates):
+        return []
+    # Test next to the steepest edge of each loop, well clear of horizontal
+    # ones.
+    owner = np.repeat(np.arange(len(counts)), counts)
+    rise = np.abs(points[following[loops], 1] - points[loops, 1])
+    steepest = loops[np.lexsort((rise, owner))[offsets[1:] - 1]]
+    winding = _winding(points, following, steepest[candidates])
+    rings = []
+    for c in candidates[winding == 1]:
+        ring = points[loops[offsets[c]:offsets[c + 1]]]
+        rings.append(ring[np.any(ring != np.roll(ring, -1, axis=0), axis=1)])
+    return rings
+
+
+def _check(distance: float, tolerance: float) -> None:
+    if not math.isfinite(distance):
+        raise ValueError("Offset distance must be finite")
+    # A vanishing tolerance asks for an unbounded number of arc points.
+    if not tolerance > 0:
+        raise ValueError("Offset tolerance must be positive")
+
+
+def offset_packed(
+    vertices: np.ndarray,
+    offsets: np.ndarray,
+    distance: float,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Offset every packed shape by ``distance``.
+
+    Positive distances grow shapes (profiles), negative ones shrink them
+    (pockets).
+
+    Returns
+    -------
+    vertices, offsets, source:
+        The offset rings packed like the input, and for each ring the index
+        of the shape it came from.
+    """
+
+    _check(distance, tolerance)
+    norm_vertices, norm_offsets = _normalise(np.asarray(vertices, dtype=float), np.asarray(offsets))
+    if distance == 0:
+        raw, raw_offsets = norm_vertices, norm_offsets
+    else:
+        raw, raw_offsets = _raw_offset(norm_vertices, norm_offsets, distance, tolerance)
+
+    rings: List[np.ndarray] = []
+    source: List[int] = []
+    for i in range(len(raw_offsets) - 1):
+        if raw_offsets[i] == raw_offsets[i + 1]:
+            continue
+        shape = norm_vertices[norm_offsets[i]:norm_offsets[i + 1]]
+        ring = raw[raw_offsets[i]:raw_offsets[i + 1]]
+        scale = max(float(np.abs(shape).max()), abs(distance), 1.0)
+        loops = [shape] if distance == 0 else _clean(ring, scale)
+        rings.extend(loops)
+        source.extend([i] * len(loops))
+
+    out_offsets = np.concatenate([[0], np.cumsum([len(r) for r in rings])]).astype(np.int64)
+    out = np.concatenate(rings) if rings else np.empty((0, 2))
+    return out, out_offsets, np.array(source, dtype=np.int64)
+
+
+_cache: "OrderedDict[Tuple[str, float, float], List[List[V2D]]]" = OrderedDict()
+
+
+def offset_shapes(
+    shapes: Sequence[Sequence[V2D]],
+    distance: float,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[List[List[V2D]]]:
+    """Offset ``shapes`` by ``distance``, returning the rings of each shape.
+
+    Results are cached per shape hash, distance and tolerance; shapes not in
+    the cache are offset together in a single :func:`offset_packed` call.
+    """
+
+    _check(distance, tolerance)
+    keys = [(shape_hash(shape), float(distance), float(tolerance)) for shape in shapes]
+    found = {}
+    missing = {}
+    for key, shape in zip(keys, shapes):
+        if key in _cache:
+            _cache.move_to_end(key)
+            found[key] = _cache[key]
+        else:
+            missing.setdefault(key, shape)
+
+    if missing:
+        arrays = [pack_shape(shape) for shape in missing.values()]
+        vertices = np.concatenate(arrays)
+        offsets = np.concatenate([[0], np.cumsum([len(a) for a in arrays])]).astype(np.int64)
+        out, out_offsets, source = offset_packed(vertices, offsets, distance, tolerance)
+        results: List[List[List[V2D]]] = [[] for _ in missing]
+        for r, i in enumerate(source):
+            results[i].append(unpack_shape(out[out_offsets[r]:out_offsets[r + 1]]))
+        for key, rings in zip(missing, results):
+            found[key] = _cache[key] = rings
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return [found[key] for key in keys]
@@ -0,0 +1,115 @@
+"""Compact representations of 2‑D shapes.
+
+Shapes on a :class:`~daiku.parts.plane.Plane` are stored as lists of
+:class:`~daiku.geo.base.V2D` points.  The helpers in this module convert
+those lists to and from packed ``float64`` vertex arrays and derive a stable
+content hash that identifies a shape independently of where it is used.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from daiku.geo.base import V2D
+
+
+def pack_shape(shape: Sequence[V2D]) -> np.ndarray:
+    """Return ``shape`` as an ``(n, 2)`` array of little‑endian doubles."""
+
+    arr = np.array([(p.x, p.y) for p in shape], dtype="<f8").reshape(-1, 2)
+    # Adding zero folds ``-0.0`` into ``0.0`` so equal shapes hash equally.
+    return arr + 0.0
+
+
+def unpack_shape(arr: np.ndarray) -> List[V2D]:
+    """Convert an ``(n, 2)`` vertex array back into ``V2D`` points."""
+
+    return [V2D(float(x), float(y)) for x, y in np.asarray(arr).reshape(-1, 2)]
+
+
+def pack_shapes(shapes: Sequence[Sequence[V2D]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack several shapes into a single vertex array.
+
+    Returns
+    -------
+    vertices, offsets:
+        ``vertices`` is an ``(n, 2)`` array holding every vertex and
+        ``offsets`` an ``(m + 1,)`` integer array such that shape ``i`` is
+        ``vertices[offsets[i]:offsets[i + 1]]``.
+    """
+
+    offsets = np.zeros(len(shapes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(s) for s in shapes])
+    vertices = np.empty((int(offsets[-1]), 2), dtype="<f8")
+    for i, shape in enumerate(shapes):
+        vertices[offsets[i]:offsets[i + 1]] = pack_shape(shape)
+    return vertices, offsets
+
+
+def unpack_shapes(vertices: np.ndarray, offsets: np.ndarray) -> List[List[V2D]]:
+    """Inverse of :func:`pack_shapes`."""
+
+    return [
+        unpack_shape(vertices[offsets[i]:offsets[i + 1]])
+        for i in range(len(offsets) - 1)
+    ]
+
+
+def shape_hash(shape: Sequence[V2D]) -> str:
+    """Return the SHA‑256 hex digest of the canonical vertex data of ``shape``."""
+
+    return packed_shape_hash(pack_shape(shape))
+
+
+def packed_shape_hash(arr: np.ndarray) -> str:
+    """:func:`shape_hash` of a shape already packed by :func:`pack_shape`."""
+
+    return hashlib.sha256(np.ascontiguousarray(arr, dtype="<f8").tobytes()).hexdigest()
+
+
+def shape_bounds(vertices: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Bounding boxes of packed shapes.
+
+    Returns an ``(m, 4)`` array of ``xmin, ymin, xmax, ymax`` rows; empty
+    shapes yield ``nan``.
+    """
+
+    out = np.full((len(offsets) - 1, 4), np.nan)
+    nonempty = offsets[1:] > offsets[:-1]
+    if nonempty.any():
+        starts = offsets[:-1][nonempty]
+        out[nonempty, :2] = np.minimum.reduceat(vertices, starts, axis=0)
+        out[nonempty, 2:] = np.maximum.reduceat(vertices, starts, axis=0)
+    return out
+
+
+def next_vertex(offsets: np.ndarray) -> np.ndarray:
+    """Index of the following vertex of each vertex, wrapping per shape."""
+
+    nxt = np.arange(1, int(offsets[-1]) + 1)
+    nonempty = offsets[1:] > offsets[:-1]
+    nxt[offsets[1:][nonempty] - 1] = offsets[:-1][nonempty]
+    return nxt
+
+
+def _segment_sums(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    cs = np.concatenate([[0.0], np.cumsum(values)])
+    return cs[offsets[1:]] - cs[offsets[:-1]]
+
+
+def shape_areas(vertices: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Signed areas of packed closed shapes (positive when counter‑clockwise)."""
+
+    nxt = vertices[next_vertex(offsets)]
+    cross = vertices[:, 0] * nxt[:, 1] - nxt[:, 0] * vertices[:, 1]
+    return _segment_sums(cross, offsets) / 2.0
+
+
+def shape_perimeters(vertices: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Perimeters of packed closed shapes."""
+
+    nxt = vertices[next_vertex(offsets)]
+    return _segment_sums(np.hypot(*(nxt - vertices).T), offsets)
@@ -0,0 +1,235 @@
+"""Spatial index over the shapes of a plane.
+
+:class:`ShapeIndex` treats every shape of a :class:`~daiku.parts.plane.Plane`
+as a closed polygon and answers the queries needed for interactive editing
+without scanning every segment:
+
+* :meth:`ShapeIndex.contains` – which shapes contain a point,
+* :meth:`ShapeIndex.nearest_segment` – the closest edge to a point,
+* :meth:`ShapeIndex.window` – window or crossing selection by rectangle.
+
+It stores one bounding box per shape and buckets the segments into a uniform
+grid sized so that each cell holds about one segment on average.  Segments
+are registered in the cells they pass through (see :mod:`daiku.geo.grid`),
+not in every cell of their bounding box.  Planes
+build their index lazily through :attr:`Plane.index
+<daiku.parts.plane.Plane.index>`.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from daiku.geo.base import V2D
+from daiku.geo.grid import grid_shape, segment_cells
+from daiku.geo.shape import next_vertex, pack_shapes, shape_bounds
+
+
+@dataclass
+class SegmentHit:
+    """Result of :meth:`ShapeIndex.nearest_segment`."""
+
+    shape: int
+    segment: int
+    distance: float
+    point: V2D
+
+
+def _point_segment_distance(segs: np.ndarray, x: float, y: float):
+    x0, y0, x1, y1 = segs.T
+    dx, dy = x1 - x0, y1 - y0
+    length2 = dx * dx + dy * dy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(length2 > 0, ((x - x0) * dx + (y - y0) * dy) / length2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    px, py = x0 + t * dx, y0 + t * dy
+    return np.hypot(px - x, py - y), px, py
+
+
+def _segments_hit_box(segs: np.ndarray, xmin, ymin, xmax, ymax) -> np.ndarray:
+    """Liang–Barsky test of which segments touch an axis aligned box."""
+
+    x0, y0, x1, y1 = segs.T
+    dx, dy = x1 - x0, y1 - y0
+    lo = np.zeros(len(segs))
+    hi = np.ones(len(segs))
+    inside = np.ones(len(segs), dtype=bool)
+    for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+        parallel = p == 0
+        inside &= ~(parallel & (q < 0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = q / p
+        lo = np.where(~parallel & (p < 0), np.maximum(lo, r), lo)
+        hi = np.where(~parallel & (p > 0), np.minimum(hi, r), hi)
+    return inside & (lo <= hi)
+
+
+class ShapeIndex:
+    """Bounding boxes and a segment grid for a list of shapes."""
+
+    def __init__(self, shapes: Sequence[Sequence[V2D]]):
+        self.size = len(shapes)
+        vertices, offsets = pack_shapes(shapes)
+        self.bounds = shape_bounds(vertices, offsets)
+        self.segments = np.concatenate(
+            [vertices, vertices[next_vertex(offsets)]], axis=1
+        ).reshape(-1, 4)
+        counts = np.diff(offsets)
+        self.segment_shape = np.repeat(np.arange(self.size), counts)
+        self.segment_local = np.arange(len(self.segments)) - np.repeat(offsets[:-1], counts)
+        self._build_grid()
+
+    def _build_grid(self) -> None:
+        segs = self.segments
+        if not len(segs):
+            self.origin = np.zeros(2)
+            self.cell = 1.0
+            self.grid_shape = (1, 1)
+            self.cell_start = np.zeros(2, dtype=np.int64)
+            self.cell_segments = np.zeros(0, dtype=np.int64)
+            return
+        lo = segs.reshape(-1, 2).min(axis=0)
+        hi = segs.reshape(-1, 2).max(axis=0)
+        extent = float((hi - lo).max())
+        self.origin = lo
+        self.cell = extent / max(1.0, math.sqrt(len(segs))) or 1.0
+        nx, ny = self.grid_shape = grid_shape(lo, hi, self.cell)
+
+        seg_ids, cx, cy = segment_cells(segs, lo, self.cell, self.grid_shape)
+        cell_ids = cy * nx + cx
+        order = np.argsort(cell_ids, kind="stable")
+        self.cell_segments = seg_ids[order]
+        self.cell_start = np.searchsorted(cell_ids[order], np.arange(nx * ny + 1))
+
+    def _cells(self, points: np.ndarray) -> np.ndarray:
+        idx = np.floor((points - self.origin) / self.cell).astype(np.int64)
+        return np.clip(idx, 0, np.array(self.grid_shape) - 1)
+
+    def _segments_in(self, cx0: int, cy0: int, cx1: int, cy1: int) -> np.ndarray:
+        nx = self.grid_shape[0]
+        parts = [
+            self.cell_segments[self.cell_start[cy * nx + cx0]:self.cell_start[cy * nx + cx1 + 1]]
+            for cy in range(cy0, cy1 + 1)
+        ]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def _ring_segments(self, cx: int, cy: int, ring: int) -> np.ndarray:
+        """Segments in the cells exactly ``ring`` cells from ``(cx, cy)``."""
+
+        nx, ny = self.grid_shape
+        x0, x1 = max(cx - ring, 0), min(cx + ring, nx - 1)
+        y0, y1 = max(cy - ring, 0), min(cy + ring, ny - 1)
+        if x0 > x1 or y0 > y1:
+            return np.zeros(0, dtype=np.int64)
+        # Bottom and top rows are runs of cells; the left and right columns,
+        # without their corners, single cells.
+        rows = np.array([row for row in {cy - ring, cy + ring} if y0 <= row <= y1], dtype=np.int64)
+        side = np.arange(max(cy - ring + 1, 0), min(cy + ring - 1, ny - 1) + 1)
+        cols = [col for col in {cx - ring, cx + ring} if x0 <= col <= x1]
+        begin = np.concatenate([rows * nx + x0] + [side * nx + col for col in cols])
+        width = np.concatenate([np.full(len(rows), x1 - x0 + 1)] + [np.ones(len(side), dtype=np.int64)] * len(cols))
+        start = self.cell_start[begin]
+        count = self.cell_start[begin + width] - start
+        picks = np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count - start, count)
+        return np.unique(self.cell_segments[picks])
+
+    def _unscanned_distance(self, x: float, y: float, cx: int, cy: int, ring: int) -> float:
+        """Lower bound on the distance from ``(x, y)`` to cells outside ``ring``."""
+
+        lo = self.origin
+        hi = lo + self.cell * np.array(self.grid_shape)
+        inner = lo + self.cell * np.array([cx - ring, cy - ring])
+        outer = inner + self.cell * (2 * ring + 1)
+        best = math.inf
+        # The grid outside the square is covered by four overlapping strips.
+        for axis in (0, 1):
+            for a, b in ((lo[axis], inner[axis]), (outer[axis], hi[axis])):
+                if a >= b:
+                    continue
+                box_lo, box_hi = lo.copy(), hi.copy()
+                box_lo[axis], box_hi[axis] = a, b
+                gap = np.maximum(np.maximum(box_lo - (x, y), (x, y) - box_hi), 0.0)
+                best = min(best, math.hypot(*gap))
+        return best
+
+    # Queries -----------------------------------------------------------
+    def contains(self, x: float, y: float) -> List[int]:
+        """Indices of the shapes whose polygon contains ``(x, y)``."""
+
+        b = self.bounds
+        if not np.any((b[:, 0] <= x) & (x <= b[:, 2]) & (b[:, 1] <= y) & (y <= b[:, 3])):
+            return []
+        # Cast a ray towards +x.  A segment crossing it runs through the
+        # grid row of ``y`` just above the ray, at or right of the query
+        # cell's left neighbour.
+        nx, ny = self.grid_shape
+        cx, cy = (math.floor(v) for v in (np.array([x, y]) - self.origin) / self.cell)
+        if not 0 <= cy < ny:
+            return []
+        ids = self._segments_in(min(max(cx - 1, 0), nx - 1), cy, nx - 1, cy)
+        x0, y0, x1, y1 = self.segments[ids].T
+        straddles = (y0 > y) != (y1 > y)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cross_x = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+        crossings = np.bincount(
+            self.segment_shape[ids[straddles & (x < cross_x)]], minlength=self.size
+        )
+        return np.flatnonzero(crossings % 2).tolist()
+
+    def nearest_segment(self, x: float, y: float, max_distance: float = math.inf) -> Optional[SegmentHit]:
+        """Closest segment to ``(x, y)``, searching the grid outwards."""
+
+        if not len(self.segments):
+            return None
+        nx, ny = self.grid_shape
+        # The query cell may lie outside the grid; rings closer than the grid
+        # are empty and skipped.
+        cx, cy = (math.floor(v) for v in (np.array([x, y]) - self.origin) / self.cell)
+        first = max(0, -cx, cx - nx + 1, -cy, cy - ny + 1)
+        last = max(cx, nx - 1 - cx, cy, ny - 1 - cy)
+        best: Optional[SegmentHit] = None
+        for ring in range(first, last + 1):
+            ids = self._ring_segments(cx, cy, ring)
+            if len(ids):
+                dist, px, py = _point_segment_distance(self.segments[ids], x, y)
+                i = int(np.argmin(dist))
+                if best is None or dist[i] < best.distance:
+                    seg = int(ids[i])
+                    best = SegmentHit(
+                        int(self.segment_shape[seg]),
+                        int(self.segment_local[seg]),
+                        float(dist[i]),
+                        V2D(float(px[i]), float(py[i])),
+                    )
+            reach = self._unscanned_distance(x, y, cx, cy, ring)
+            if (best is not None and best.distance <= reach) or reach > max_distance:
+                break
+        if best is None or best.distance > max_distance:
+            return None
+        return best
+
+    def window(self, xmin: float, ymin: float, xmax: float, ymax: float, crossing: bool = False) -> List[int]:
+        """Shapes selected by a rectangle.
+
+        By default only shapes lying entirely inside the rectangle are
+        returned; with ``crossing`` shapes whose outline touches it are
+        included as well.
+        """
+
+        b = self.bounds
+        inside = (b[:, 0] >= xmin) & (b[:, 1] >= ymin) & (b[:, 2] <= xmax) & (b[:, 3] <= ymax)
+        if not crossing or not len(self.segments):
+            return np.flatnonzero(inside).tolist()
+        (cx0, cy0), (cx1, cy1) = self._cells(np.array([[xmin, ymin], [xmax, ymax]])).tolist()
+        # A segment ending exactly on a grid line is only registered in the
+        # cell it comes from, which may be just below or left of the window.
+        ids = self._segments_in(max(cx0 - 1, 0), max(cy0 - 1, 0), cx1, cy1)
+        hit = ids[_segments_hit_box(self.segments[ids], xmin, ymin, xmax, ymax)]
+        inside[self.segment_shape[hit]] = True
+        return np.flatnonzero(inside).tolist()
@@ -11,11 +11,14 @@ The implementation relies on the basic geometry primitives defined under the
 """
 
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Optional
 
 from daiku.geo.base import GeoBase, V2D, V3D
+from daiku.geo.offset import DEFAULT_TOLERANCE, offset_shapes
 from daiku.geo.point import Point
 
+from .index import ShapeIndex
+
 
 @dataclass
 class Plane(GeoBase):
@@ -39,6 +42,15 @@ class Plane(GeoBase):
     origin: Point
     normal: V3D
     shapes: List[List[V2D]] = field(default_factory=list)
+    _index: Optional[ShapeIndex] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def index(self) -> ShapeIndex:
+        """Spatial index over :attr:`shapes`, built on first use."""
+
+        if self._index is None or self._index.size != len(self.shapes):
+            self._index = ShapeIndex(self.shapes)
+        return self._index
 
     def add_shape(self, shape: List[V2D]) -> None:
         """Attach a 2‑D shape to this plane.
@@ -51,4 +63,26 @@ class Plane(GeoBase):
         """
 
         self.shapes.append(shape)
+        self._index = None
+
+    def offset_shapes(
+        self, radius: float, inward: bool = False, tolerance: float = DEFAULT_TOLERANCE
+    ) -> List[List[List[V2D]]]:
+        """Offset every shape by a tool radius.
+
+        Parameters
+        ----------
+        radius:
+            Tool radius.
+        inward:
+            Offset inwards (pockets) instead of outwards (profiles).
+        tolerance:
+            Maximum deviation of the tessellated corner arcs.
+
+        Returns
+        -------
+        For each shape, the list of counter‑clockwise tool path rings it
+        produces.
+        """
 
+        return offset_shapes(self.shapes, -radius if inward else radius, tolerance)
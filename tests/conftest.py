@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture(autouse=True)
+def memory_backend(monkeypatch):
+    """Run handlers against the in-memory stores unless a test opts out.
+
+    boto3 is in requirements.txt, so without this every handler test would
+    try to reach a real DynamoDB endpoint.  ``tests/test_dynamodb.py`` switches
+    back to DynamoDB under moto.
+    """
+
+    import daiku.api as api
+
+    monkeypatch.setattr(api, "USE_DYNAMODB", False)
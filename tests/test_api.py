@@ -4,6 +4,9 @@ import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import pytest
+from starlette.exceptions import HTTPException
+
 from daiku.api import (
     add_part_plane,
     create_part,
@@ -11,18 +14,30 @@ from daiku.api import (
     get_part,
     get_part_plane,
     get_plane,
+    plane_hit,
+    planes_mem,
     setup_tables,
+    shape_refs_mem,
+    shapes_mem,
 )
+from daiku.geo.base import V2D
+from daiku.geo.shape import shape_hash
 
 
 class DummyRequest:
-    def __init__(self, data=None, path_params=None):
+    def __init__(self, data=None, path_params=None, query_params=None):
         self._data = data
         self.path_params = path_params or {}
+        self.query_params = query_params or {}
 
     async def json(self):
         return self._data
 
+    async def stream(self):
+        body = json.dumps(self._data).encode()
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
 
 def run(func, request):
     return asyncio.get_event_loop().run_until_complete(func(request))
@@ -80,3 +95,75 @@ def test_create_part_and_add_plane():
     )
     assert get_plane_resp.status_code == 200
     assert json.loads(get_plane_resp.body) == plane_data
+
+
+def test_repeated_shapes_are_stored_once():
+    setup_tables()
+    bore = [{"x": 0, "y": 0}, {"x": 35, "y": 0}, {"x": 35, "y": 35}]
+    key = shape_hash([V2D(p["x"], p["y"]) for p in bore])
+
+    for gid in ("dedup1", "dedup2"):
+        payload = {
+            "gid": gid,
+            "origin": {"gid": f"{gid}_o", "x": 0, "y": 0, "z": 0},
+            "normal": {"x": 0, "y": 0, "z": 1},
+            "shapes": [bore, bore],
+        }
+        run(create_plane, DummyRequest(payload))
+
+    assert shape_refs_mem[key] == 4
+    shared = shapes_mem[key]
+    assert all(s is shared for s in planes_mem["dedup1"].shapes)
+    assert all(s is shared for s in planes_mem["dedup2"].shapes)
+
+    for gid in ("dedup1", "dedup2"):
+        payload = {
+            "gid": gid,
+            "origin": {"gid": f"{gid}_o", "x": 0, "y": 0, "z": 0},
+            "normal": {"x": 0, "y": 0, "z": 1},
+            "shapes": [],
+        }
+        run(create_plane, DummyRequest(payload))
+        resp = run(get_plane, DummyRequest(path_params={"plane_id": gid}))
+        assert json.loads(resp.body)["shapes"] == []
+
+    assert key not in shape_refs_mem
+    assert key not in shapes_mem
+
+
+def test_plane_hit_test():
+    setup_tables()
+    payload = {
+        "gid": "hit1",
+        "origin": {"gid": "hit1_o", "x": 0, "y": 0, "z": 0},
+        "normal": {"x": 0, "y": 0, "z": 1},
+        "shapes": [[{"x": 0, "y": 0}, {"x": 4, "y": 0}, {"x": 4, "y": 4}, {"x": 0, "y": 4}]],
+    }
+    run(create_plane, DummyRequest(payload))
+
+    resp = run(
+        plane_hit,
+        DummyRequest(path_params={"plane_id": "hit1"}, query_params={"x": "1", "y": "3.5"}),
+    )
+    data = json.loads(resp.body)
+    assert data["inside"] == [0]
+    assert data["nearest"] == {"shape": 0, "segment": 2, "distance": 0.5, "point": {"x": 1.0, "y": 4.0}}
+
+    resp = run(
+        plane_hit,
+        DummyRequest(
+            path_params={"plane_id": "hit1"},
+            query_params={"x": "10", "y": "10", "tolerance": "1"},
+        ),
+    )
+    assert json.loads(resp.body) == {"inside": [], "nearest": None}
+
+    for params in (
+        {"x": "nan", "y": "1"},
+        {"x": "1", "y": "inf"},
+        {"x": "1", "y": "1", "tolerance": "nan"},
+        {"x": "1", "y": "1", "tolerance": "-1"},
+    ):
+        with pytest.raises(HTTPException) as exc:
+            run(plane_hit, DummyRequest(path_params={"plane_id": "hit1"}, query_params=params))
+        assert exc.value.status_code == 400
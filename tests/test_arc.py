@@ -7,13 +7,20 @@ sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
 import math
 
+import numpy as np
+
 from daiku.geo.base import V3D
+from daiku.geo.line import Line
 from daiku.geo.arc import (
     Arc,
     ArcDirection,
     CenterArcConfig,
     EndpointsArcConfig,
     ThreePointArcConfig,
+    arc_bounds,
+    arc_closest_points,
+    arc_lengths,
+    pack_arcs,
 )
 
 
@@ -64,3 +71,66 @@ def test_arc_constructed_from_endpoints_and_radius():
     assert arc.end == end
     assert math.isclose(arc.mid.x, math.sqrt(0.5), rel_tol=1e-9)
     assert math.isclose(arc.mid.y, math.sqrt(0.5), rel_tol=1e-9)
+
+
+def test_arc_length_and_bounds_follow_direction():
+    ccw = Arc.from_center("a", V3D(0, 0, 0), 2.0, 0.3, -0.3)
+    cw = Arc.from_center("b", V3D(0, 0, 0), 2.0, 0.3, -0.3, ArcDirection.CW)
+    full = Arc.from_center("c", V3D(0, 0, 0), 1.0, 0.0, 2 * math.pi)
+
+    assert math.isclose(ccw.length(), 2.0 * (2 * math.pi - 0.6))
+    assert math.isclose(cw.length(), 2.0 * 0.6)
+    assert math.isclose(full.length(), 2 * math.pi)
+
+    xmin, ymin, xmax, ymax = ccw.bounds()
+    assert (xmin, ymin, ymax) == (-2.0, -2.0, 2.0)
+    assert math.isclose(xmax, 2.0 * math.cos(0.3))
+    assert cw.bounds() == (2.0 * math.cos(0.3), -2.0 * math.sin(0.3), 2.0, 2.0 * math.sin(0.3))
+
+
+def test_arc_closest_point_and_intersections():
+    arc = Arc.from_center("a", V3D(0, 0, 0), 1.0, 0.0, math.pi / 2)
+
+    p = arc.closest_point(V3D(2, 2, 0))
+    assert math.isclose(p.x, math.sqrt(0.5)) and math.isclose(p.y, math.sqrt(0.5))
+    assert math.isclose(arc.distance(V3D(-1, -0.1, 0)), math.hypot(1, 1.1))
+
+    hits = arc.intersect_line(Line("l", V3D(-2, 0.5, 0), V3D(2, 0.5, 0)))
+    assert len(hits) == 1
+    assert math.isclose(hits[0].x, math.sqrt(0.75))
+
+    circle = Arc.from_center("c", V3D(1, 0, 0), 1.0, 0.0, 2 * math.pi)
+    hits = arc.intersect_arc(circle)
+    assert len(hits) == 1
+    assert math.isclose(hits[0].x, 0.5) and math.isclose(hits[0].y, math.sqrt(0.75))
+
+
+def test_vectorized_queries_match_single_arcs():
+    rng = np.random.default_rng(0)
+    arcs = [
+        Arc.from_center(
+            str(i),
+            V3D(*rng.uniform(-10, 10, 2), 0.0),
+            float(rng.uniform(0.5, 3)),
+            float(rng.uniform(-math.pi, math.pi)),
+            float(rng.uniform(-math.pi, math.pi)),
+            ArcDirection.CCW if i % 2 else ArcDirection.CW,
+        )
+        for i in range(200)
+    ]
+    packed = pack_arcs(arcs)
+    query = V3D(1.5, -2.0, 0.0)
+
+    lengths = arc_lengths(packed)
+    bounds = arc_bounds(packed)
+    _, dist = arc_closest_points(packed, query.x, query.y)
+    for i, arc in enumerate(arcs):
+        assert lengths[i] == arc.length()
+        assert tuple(bounds[i]) == arc.bounds()
+        assert dist[i] == arc.distance(query)
+        # Dense sampling never beats the exact closest distance.
+        t = np.linspace(0, arc.sweep, 2000) + arc.start_angle
+        xs = arc.center.x + arc.radius * np.cos(t)
+        ys = arc.center.y + arc.radius * np.sin(t)
+        assert dist[i] <= np.hypot(xs - query.x, ys - query.y).min() + 1e-12
+        assert bounds[i][0] <= xs.min() + 1e-9 and bounds[i][2] >= xs.max() - 1e-9
@@ -0,0 +1,103 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+from daiku.api import cache as cache_module
+from daiku.api.cache import SharedCache
+
+
+def small_cache(path, **kwargs):
+    return SharedCache(str(path), capacity=8192, block_size=64, stamps=16, bump_interval=0, **kwargs)
+
+
+def test_put_get_and_overwrite(tmp_path):
+    cache = small_cache(tmp_path / "cache")
+    assert cache.get("planes/a") is None
+    long_value = bytes(range(256)) * 2
+    assert cache.put("planes/a", long_value)
+    assert cache.put("planes/b", b"")
+    assert cache.get("planes/a") == long_value
+    assert cache.get("planes/b") == b""
+    assert cache.put("planes/a", b"short")
+    assert cache.get("planes/a") == b"short"
+    assert len(cache) == 2
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = small_cache(tmp_path / "cache")
+    # Keys are 10 bytes, so every entry is exactly ``max_size`` bytes.
+    value = b"x" * (cache.max_size - 10)
+    fits = cache.blocks // -(-cache.max_size // cache.block_size)
+    for i in range(fits):
+        assert cache.put(f"key/{i:06d}", value)
+    # Reading the oldest entry makes the second oldest the eviction victim.
+    assert cache.get("key/000000") == value
+    assert cache.put("key/extra0", value)
+    assert cache.get("key/000000") == value
+    assert cache.get("key/000001") is None
+    assert len(cache) == fits
+    cache.close()
+
+
+def test_oversized_values_are_not_stored(tmp_path):
+    cache = small_cache(tmp_path / "cache")
+    assert not cache.put("big", b"x" * (cache.max_size + 1))
+    assert cache.get("big") is None
+    cache.close()
+
+
+def test_invalidation_rejects_stale_puts(tmp_path):
+    cache = small_cache(tmp_path / "cache")
+    stamp = cache.stamp("parts/p")
+    cache.invalidate("parts/p")
+    assert not cache.put("parts/p", b"stale", stamp)
+    assert cache.put("parts/p", b"fresh", cache.stamp("parts/p"))
+    assert cache.get("parts/p") == b"fresh"
+    cache.close()
+
+
+def test_interrupted_write_resets_cache(tmp_path):
+    cache = small_cache(tmp_path / "cache")
+    cache.put("planes/a", b"payload")
+    # Flag left behind by a writer that crashed half way through.
+    cache._header[cache_module._H_DIRTY] = 1
+    assert cache.get("planes/a") is None
+    assert cache.put("planes/a", b"payload")
+    assert cache.get("planes/a") == b"payload"
+    cache.close()
+
+
+CHILD = """
+import sys
+from daiku.api.cache import SharedCache
+cache = SharedCache(sys.argv[1], capacity=1 << 20)
+print(cache.get("planes/shared").decode())
+cache.invalidate("planes/shared")
+cache.put("planes/child", b"from child")
+"""
+
+
+def test_entries_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / "cache")
+    cache = SharedCache(path, capacity=1 << 20)
+    cache.put("planes/shared", b"from parent")
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, path], cwd=ROOT, check=True, capture_output=True, text=True
+    )
+    assert out.stdout.strip() == "from parent"
+    assert cache.get("planes/shared") is None
+    assert cache.get("planes/child") == b"from child"
+    cache.close()
+
+
+def test_capacity_is_capped_by_free_space(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "_room", lambda fd: 1 << 20)
+    cache = SharedCache(str(tmp_path / "cache"), capacity=1 << 40)
+    assert os.path.getsize(tmp_path / "cache") <= 1 << 20
+    assert cache.put("planes/a", b"payload")
+    assert cache.get("planes/a") == b"payload"
+    cache.close()
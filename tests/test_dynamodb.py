@@ -0,0 +1,198 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+moto = pytest.importorskip("moto")
+
+import daiku.api as api
+from daiku.api import create_part, create_plane, get_part, get_plane
+from daiku.api.writer import WriteBehindBuffer
+from daiku.geo.base import V2D
+from daiku.geo.shape import shape_hash
+
+
+class DummyRequest:
+    def __init__(self, data=None, path_params=None, query_params=None):
+        self._data = data
+        self.path_params = path_params or {}
+        self.query_params = query_params or {}
+
+    async def json(self):
+        return self._data
+
+    async def stream(self):
+        body = json.dumps(self._data).encode()
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+
+def run(func, request):
+    return asyncio.get_event_loop().run_until_complete(func(request))
+
+
+@pytest.fixture(autouse=True)
+def dynamodb_backend(monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.delenv("DYNAMODB_ENDPOINT_URL", raising=False)
+    with moto.mock_aws():
+        monkeypatch.setattr(api, "USE_DYNAMODB", True)
+        monkeypatch.setattr(api, "_tables_ready", False)
+        monkeypatch.setattr(api, "_local", threading.local())
+        monkeypatch.setattr(api, "write_buffer", None)
+        api._index_cache.clear()
+        api._shared_resource.cache_clear()
+        api._flush_resource.cache_clear()
+        yield
+        api._shared_resource.cache_clear()
+        api._flush_resource.cache_clear()
+
+
+SQUARE = [{"x": 0, "y": 0}, {"x": 1, "y": 0}, {"x": 1, "y": 1}, {"x": 0, "y": 1}]
+TRIANGLE = [{"x": 0, "y": 0}, {"x": 2, "y": 0}, {"x": 0, "y": 2}]
+
+
+def plane(gid, *shapes):
+    return {
+        "gid": gid,
+        "origin": {"gid": "o", "x": 0, "y": 0, "z": 0},
+        "normal": {"x": 0, "y": 0, "z": 1},
+        "shapes": list(shapes),
+    }
+
+
+def key(shape):
+    return shape_hash([V2D(p["x"], p["y"]) for p in shape])
+
+
+def refs():
+    items = api.shapes_table().scan()["Items"]
+    return {item["gid"]: int(item["refs"]) for item in items}
+
+
+def test_identical_shapes_are_stored_once():
+    run(create_plane, DummyRequest(plane("a", SQUARE)))
+    run(create_plane, DummyRequest(plane("b", SQUARE, SQUARE)))
+    assert refs() == {key(SQUARE): 3}
+
+    body = json.loads(run(get_plane, DummyRequest(path_params={"plane_id": "b"})).body)
+    assert body["shapes"] == [SQUARE, SQUARE]
+    stored = json.loads(api.planes_table().get_item(Key={"gid": "b"})["Item"]["data"])
+    assert stored["shapes"] == [key(SQUARE), key(SQUARE)]
+
+
+def test_overwrite_releases_old_shapes():
+    run(create_plane, DummyRequest(plane("a", SQUARE)))
+    run(create_plane, DummyRequest(plane("b", SQUARE)))
+    run(create_plane, DummyRequest(plane("a", TRIANGLE)))
+    assert refs() == {key(SQUARE): 1, key(TRIANGLE): 1}
+
+    run(create_plane, DummyRequest(plane("b", TRIANGLE)))
+    assert refs() == {key(TRIANGLE): 2}
+
+
+def test_part_planes_round_trip():
+    payload = {
+        "gid": "part",
+        "origin": {"gid": "o", "x": 0, "y": 0, "z": 0},
+        "width": 1,
+        "height": 2,
+        "depth": 3,
+        "planes": [plane("p1", SQUARE), plane("p2", SQUARE, TRIANGLE)],
+    }
+    run(create_part, DummyRequest(payload))
+    assert refs() == {key(SQUARE): 2, key(TRIANGLE): 1}
+    data = json.loads(run(get_part, DummyRequest(path_params={"part_id": "part"})).body)
+    assert [p["shapes"] for p in data["planes"]] == [[SQUARE], [SQUARE, TRIANGLE]]
+
+
+def test_write_behind_flush_survives_a_failed_write(monkeypatch):
+    # Flush by hand only; a background flush would race the assertions.
+    buffer = WriteBehindBuffer(api._flush_writes, interval=3600)
+    monkeypatch.setattr(api, "write_buffer", buffer)
+    run(create_plane, DummyRequest(plane("a", SQUARE)))
+    buffer.flush()
+    assert refs() == {key(SQUARE): 1}
+
+    # Both planes move to the triangle, but only the first put lands.
+    run(create_plane, DummyRequest(plane("a", TRIANGLE)))
+    run(create_plane, DummyRequest(plane("b", TRIANGLE, SQUARE)))
+    # Buffered writes are visible before they are flushed.
+    body = json.loads(run(get_plane, DummyRequest(path_params={"plane_id": "b"})).body)
+    assert body["shapes"] == [TRIANGLE, SQUARE]
+
+    real_write = api._batch_write_ddb
+
+    def partial_write(puts, written=None):
+        real_write(puts[:1], written)
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(api, "_batch_write_ddb", partial_write)
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    assert refs() == {key(TRIANGLE): 1}
+    assert len(buffer) == 2
+
+    # The retry rewrites plane "a" unchanged and must not count it twice.
+    monkeypatch.setattr(api, "_batch_write_ddb", real_write)
+    buffer.flush()
+    assert len(buffer) == 0
+    assert refs() == {key(TRIANGLE): 2, key(SQUARE): 1}
+    body = json.loads(run(get_plane, DummyRequest(path_params={"plane_id": "b"})).body)
+    assert body["shapes"] == [TRIANGLE, SQUARE]
+
+
+def test_flushes_use_their_own_resource(monkeypatch):
+    api.setup_tables()
+    shared = api.dynamodb()
+    resources = []
+    real_write = api._batch_write_ddb
+
+    def write(puts, written=None):
+        resources.append(api.dynamodb())
+        real_write(puts, written)
+
+    def worker():
+        resources.append(api.dynamodb())
+        api._flush_writes({"parts": {"t": {"gid": "t", "data": "{}"}}})
+
+    monkeypatch.setattr(api, "_batch_write_ddb", write)
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    # Handlers on any thread share the warmed resource; only flushes differ.
+    assert resources[0] is shared
+    assert resources[1] is api._flush_resource() and resources[1] is not shared
+    assert api.dynamodb() is shared
+    assert api.parts_table().get_item(Key={"gid": "t"})["Item"]["data"] == "{}"
+
+
+def test_buffered_writes_bypass_the_shared_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(api, "SHARED_CACHE", str(tmp_path / "cache"))
+    api.shared_cache.cache_clear()
+    try:
+        buffer = WriteBehindBuffer(api._flush_writes, interval=3600)
+        monkeypatch.setattr(api, "write_buffer", buffer)
+        cache = api.shared_cache()
+        run(create_plane, DummyRequest(plane("a", SQUARE)))
+        buffer.flush()
+        run(get_plane, DummyRequest(path_params={"plane_id": "a"}))
+        assert cache.get("planes/a") is not None
+
+        run(create_plane, DummyRequest(plane("a", TRIANGLE)))
+        for _ in range(2):
+            body = json.loads(run(get_plane, DummyRequest(path_params={"plane_id": "a"})).body)
+            assert body["shapes"] == [TRIANGLE]
+            assert cache.get("planes/a") is None
+
+        buffer.flush()
+        body = json.loads(run(get_plane, DummyRequest(path_params={"plane_id": "a"})).body)
+        assert body["shapes"] == [TRIANGLE]
+        assert json.loads(cache.get("planes/a"))["shapes"] == [TRIANGLE]
+    finally:
+        api.shared_cache.cache_clear()
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from starlette.exceptions import HTTPException
+
+from daiku.api import add_part_plane, create_part, get_part
+from daiku.api.feed import ChangeFeed, feed, part_changes
+
+
+class DummyRequest:
+    def __init__(self, data=None, path_params=None, query_params=None):
+        self._data = data
+        self.path_params = path_params or {}
+        self.query_params = query_params or {}
+        self.headers = {}
+
+    async def json(self):
+        return self._data
+
+    async def stream(self):
+        body = json.dumps(self._data).encode()
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+
+def run(func, request):
+    return asyncio.get_event_loop().run_until_complete(func(request))
+
+
+def plane(gid, shapes):
+    return {
+        "gid": gid,
+        "origin": {"gid": f"{gid}_o", "x": 0, "y": 0, "z": 0},
+        "normal": {"x": 0, "y": 0, "z": 1},
+        "shapes": shapes,
+    }
+
+
+SQUARE = [{"x": 0, "y": 0}, {"x": 1, "y": 0}, {"x": 1, "y": 1}]
+
+
+def test_part_edits_produce_compact_deltas():
+    part = {
+        "gid": "feed_part",
+        "origin": {"gid": "fo", "x": 0, "y": 0, "z": 0},
+        "width": 1.0,
+        "height": 2.0,
+        "depth": 3.0,
+        "planes": [plane("fp1", [SQUARE])],
+    }
+    run(create_part, DummyRequest(part))
+    topic = "parts/feed_part"
+    resp = run(get_part, DummyRequest(path_params={"part_id": "feed_part"}))
+    version = feed.parse(resp.headers["X-Change-Version"])
+    assert [d["op"] for d in feed.since(topic, 0)] == ["part", "plane"]
+
+    run(add_part_plane, DummyRequest(plane("fp1", [SQUARE, SQUARE[:2]]), {"part_id": "feed_part"}))
+    run(add_part_plane, DummyRequest(plane("fp1", [SQUARE, SQUARE[:2]]), {"part_id": "feed_part"}))
+    part["width"] = 5.0
+    part["planes"] = []
+    run(create_part, DummyRequest(part))
+
+    deltas = feed.since(topic, version)
+    assert [d["op"] for d in deltas] == ["shapes_added", "part", "plane_removed"]
+    assert deltas[0]["start"] == 1
+    assert deltas[0]["shapes"] == [SQUARE[:2]]
+    assert deltas[1]["width"] == 5.0
+    assert [d["version"] for d in deltas] == [version + 1, version + 2, version + 3]
+
+
+def test_stream_resumes_from_version():
+    part = {
+        "gid": "stream_part",
+        "origin": {"gid": "so", "x": 0, "y": 0, "z": 0},
+        "width": 1.0,
+        "height": 1.0,
+        "depth": 1.0,
+        "planes": [plane("sp1", [SQUARE])],
+    }
+    run(create_part, DummyRequest(part))
+    part["planes"] = []
+    run(create_part, DummyRequest(part))
+    current = feed.version("parts/stream_part")
+    resp = run(
+        part_changes,
+        DummyRequest(path_params={"part_id": "stream_part"}, query_params={"since": feed.token(current - 1)}),
+    )
+    assert resp.media_type == "text/event-stream"
+
+    chunk = asyncio.get_event_loop().run_until_complete(resp.body_iterator.__anext__())
+    lines = chunk.strip().split("\n")
+    assert lines[0] == f"id: {feed.token(current)}"
+    assert lines[1] == "event: plane_removed"
+    data = json.loads(lines[2][len("data: "):])
+    assert data["plane"] == "sp1"
+    assert data["version"] == feed.token(current)
+    asyncio.get_event_loop().run_until_complete(resp.body_iterator.aclose())
+
+    # Versions from the future or from another process cannot be resumed,
+    # even where the counter alone would look plausible.
+    for since in (feed.token(999999), f"other{feed.epoch}:{current - 1}"):
+        resp = run(
+            part_changes,
+            DummyRequest(path_params={"part_id": "stream_part"}, query_params={"since": since}),
+        )
+        chunk = asyncio.get_event_loop().run_until_complete(resp.body_iterator.__anext__())
+        assert "event: reset" in chunk
+        assert f"id: {feed.token(current)}" in chunk
+        asyncio.get_event_loop().run_until_complete(resp.body_iterator.aclose())
+
+    with pytest.raises(HTTPException) as exc:
+        run(part_changes, DummyRequest(path_params={"part_id": "stream_part"}, query_params={"since": "3"}))
+    assert exc.value.status_code == 400
+
+
+def test_part_planes_are_published_on_their_own_topic():
+    part = {
+        "gid": "topic_part",
+        "origin": {"gid": "to", "x": 0, "y": 0, "z": 0},
+        "width": 1.0,
+        "height": 1.0,
+        "depth": 1.0,
+        "planes": [plane("tp1", [SQUARE])],
+    }
+    run(create_part, DummyRequest(part))
+    start = feed.version("planes/tp1") - 1
+    assert [d["op"] for d in feed.since("planes/tp1", start)] == ["plane"]
+
+    part["planes"] = [plane("tp1", [SQUARE, SQUARE])]
+    run(create_part, DummyRequest(part))
+    assert [d["op"] for d in feed.since("planes/tp1", start)] == ["plane", "shapes_added"]
+
+
+def test_idle_topics_are_forgotten_unless_followed():
+    changes = ChangeFeed(max_topics=2)
+    changes.subscribe("a")
+    changes.publish("a", {"op": "part"})
+    changes.publish("b", {"op": "part"})
+    changes.publish("b", {"op": "part"})
+    changes.publish("c", {"op": "part"})
+
+    # "b" was the least recently changed topic nobody follows.
+    assert changes.since("b", 1) is None
+    assert changes.version("b") == 2
+    assert [d["version"] for d in changes.since("a", 0)] == [1]
+    # Versions of new topics continue above the forgotten ones.
+    assert changes.publish("d", {"op": "part"}) == 3
+    assert changes.since("c", 0) is None
+
+    changes.unsubscribe("a")
+    changes.publish("e", {"op": "part"})
+    assert changes.since("a", 0) is None
+
+
+def test_retained_deltas_are_bounded_by_size():
+    changes = ChangeFeed(max_bytes=2000)
+    shapes = [[{"x": 0, "y": 0}] * 10]
+    for topic in ("a", "b", "c"):
+        for _ in range(3):
+            changes.publish(topic, {"op": "shapes_replaced", "plane": "p", "shapes": shapes})
+
+    # Each delta is about 300 bytes: "a" lost its whole log, "b" and "c"
+    # kept theirs.
+    assert changes._bytes <= 2000
+    assert changes.since("a", 0) is None
+    assert changes.version("a") == 3
+    assert len(changes.since("b", 0)) == 3
+    assert len(changes.since("c", 0)) == 3
+
+    big = [[{"x": 0, "y": 0}] * 200]
+    changes.publish("c", {"op": "shapes_replaced", "plane": "p", "shapes": big})
+    assert changes.since("b", 0) is None
+    assert [d["version"] for d in changes.since("c", 3)] == [4]
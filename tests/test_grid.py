@@ -0,0 +1,49 @@
+import pathlib
+import sys
+
+# Ensure the package root is on the import path when running tests without
+# installing the package.
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import numpy as np
+
+from daiku.geo.grid import grid_shape, segment_cells
+from daiku.parts.index import _segments_hit_box
+
+
+def test_segments_are_walked_through_the_cells_they_cross():
+    segs = np.array([
+        [0.5, 0.5, 0.6, 0.7],   # inside one cell
+        [0.5, 0.5, 3.5, 0.5],   # horizontal run
+        [0.5, 3.5, 3.5, 0.5],   # diagonal through cell corners
+        [3.9, 0.2, 0.1, 1.4],   # shallow, right to left
+        [0.0, 0.0, 4.0, 4.0],   # rising diagonal from corner to corner
+    ])
+    seg, cx, cy = segment_cells(segs, np.zeros(2), 1.0, (4, 4))
+    cells = [sorted(zip(cx[seg == i].tolist(), cy[seg == i].tolist())) for i in range(len(segs))]
+
+    assert cells[0] == [(0, 0)]
+    assert cells[1] == [(0, 0), (1, 0), (2, 0), (3, 0)]
+    assert cells[2] == [(0, 3), (1, 2), (2, 1), (3, 0)]
+    assert cells[3] == [(0, 1), (1, 0), (1, 1), (2, 0), (3, 0)]
+    assert cells[4] == [(0, 0), (1, 1), (2, 2), (3, 3)]
+
+
+def test_cells_cover_every_point_and_touch_the_segment():
+    rng = np.random.default_rng(7)
+    segs = rng.uniform(0, 20, (200, 4))
+    lo = segs.reshape(-1, 2).min(axis=0)
+    hi = segs.reshape(-1, 2).max(axis=0)
+    cell = 0.7
+    shape = grid_shape(lo, hi, cell)
+    seg, cx, cy = segment_cells(segs, lo, cell, shape)
+
+    t = np.linspace(0, 1, 20001)[1:-1, None]
+    for i, (x0, y0, x1, y1) in enumerate(segs):
+        points = np.array([x0, y0]) + t * np.array([x1 - x0, y1 - y0])
+        sampled = {tuple(c) for c in np.floor((points - lo) / cell).astype(int).tolist()}
+        walked = set(zip(cx[seg == i].tolist(), cy[seg == i].tolist()))
+        assert sampled <= walked
+        for x, y in walked:
+            box = lo + cell * np.array([x, y, x + 1, y + 1]).reshape(2, 2)
+            assert _segments_hit_box(segs[i:i + 1], *box[0], *box[1])[0]
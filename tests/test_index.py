@@ -0,0 +1,130 @@
+import pathlib
+import sys
+
+# Ensure the package root is on the import path when running tests without
+# installing the package.
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import math
+
+import numpy as np
+
+from daiku.geo.base import V2D, V3D
+from daiku.geo.point import Point
+from daiku.parts import Plane
+from daiku.parts.index import ShapeIndex, _segments_hit_box
+
+
+def square(x, y, size):
+    return [V2D(x, y), V2D(x + size, y), V2D(x + size, y + size), V2D(x, y + size)]
+
+
+def brute_nearest(shapes, x, y):
+    best = math.inf
+    for shape in shapes:
+        for a, b in zip(shape, shape[1:] + shape[:1]):
+            dx, dy = b.x - a.x, b.y - a.y
+            t = ((x - a.x) * dx + (y - a.y) * dy) / (dx * dx + dy * dy)
+            t = min(1.0, max(0.0, t))
+            best = min(best, math.hypot(a.x + t * dx - x, a.y + t * dy - y))
+    return best
+
+
+def test_point_in_polygon_and_window_select():
+    outer = square(0, 0, 10)
+    hole = square(2, 2, 2)
+    far = square(20, 20, 1)
+    index = ShapeIndex([outer, hole, far, []])
+
+    assert index.contains(3, 3) == [0, 1]
+    assert index.contains(8, 8) == [0]
+    assert index.contains(15, 15) == []
+    assert index.window(1, 1, 5, 5) == [1]
+    assert index.window(1, 1, 5, 5, crossing=True) == [1]
+    assert index.window(-1, 4, 1, 6, crossing=True) == [0]
+    assert index.window(-1, -1, 30, 30) == [0, 1, 2]
+
+
+def test_nearest_segment_matches_brute_force():
+    rng = np.random.default_rng(1)
+    shapes = [square(*rng.uniform(0, 100, 2), float(rng.uniform(0.5, 5))) for _ in range(300)]
+    index = ShapeIndex(shapes)
+
+    for x, y in rng.uniform(-20, 120, (50, 2)):
+        hit = index.nearest_segment(x, y)
+        assert math.isclose(hit.distance, brute_nearest(shapes, x, y), abs_tol=1e-9)
+        assert 0 <= hit.segment < len(shapes[hit.shape])
+        assert math.isclose(hit.distance, math.hypot(hit.point.x - x, hit.point.y - y))
+
+    assert index.nearest_segment(-500, -500, max_distance=1.0) is None
+
+
+def test_segments_are_registered_only_in_cells_they_touch():
+    rng = np.random.default_rng(2)
+    shapes = [square(*rng.uniform(0, 100, 2), 1.0) for _ in range(100)]
+    shapes.append([V2D(0, 0), V2D(100, 100), V2D(0, 100)])
+    index = ShapeIndex(shapes)
+
+    nx = index.grid_shape[0]
+    cell = np.repeat(np.arange(len(index.cell_start) - 1), np.diff(index.cell_start))
+    lo = index.origin + index.cell * np.stack([cell % nx, cell // nx], axis=1)
+    for seg, (x0, y0), (x1, y1) in zip(index.cell_segments, lo, lo + index.cell):
+        assert _segments_hit_box(index.segments[seg:seg + 1], x0, y0, x1, y1)[0]
+    # The diagonal crosses a line of cells, not its whole bounding box.
+    assert np.count_nonzero(index.cell_segments == len(index.segments) - 2) < 3 * nx
+
+    assert index.window(49.5, 49.5, 50.5, 50.5, crossing=True) == [100]
+
+
+def test_far_queries_start_at_the_grid(monkeypatch):
+    rng = np.random.default_rng(3)
+    shapes = [square(*rng.uniform(0, 100, 2), float(rng.uniform(0.5, 5))) for _ in range(300)]
+    index = ShapeIndex(shapes)
+    rings = []
+    scan = index._ring_segments
+    monkeypatch.setattr(index, "_ring_segments", lambda *args: rings.append(args) or scan(*args))
+
+    for x, y in [(-1e6, 50), (50, 1e6), (1e5, -1e5)]:
+        rings.clear()
+        hit = index.nearest_segment(x, y)
+        assert math.isclose(hit.distance, brute_nearest(shapes, x, y), rel_tol=1e-12)
+        assert len(rings) < 10
+    assert index.nearest_segment(-1e6, 50, max_distance=1e3) is None
+
+
+def test_contains_matches_brute_force():
+    rng = np.random.default_rng(4)
+    shapes = []
+    for _ in range(40):
+        cx, cy = rng.uniform(0, 50, 2)
+        theta = np.sort(rng.uniform(0, 2 * np.pi, 30))
+        radius = rng.uniform(1, 8, 30)
+        shapes.append([V2D(cx + r * math.cos(t), cy + r * math.sin(t)) for t, r in zip(theta, radius)])
+    index = ShapeIndex(shapes)
+
+    def brute_contains(x, y):
+        inside = []
+        for i, shape in enumerate(shapes):
+            odd = False
+            for a, b in zip(shape, shape[1:] + shape[:1]):
+                if (a.y > y) != (b.y > y) and x < a.x + (y - a.y) * (b.x - a.x) / (b.y - a.y):
+                    odd = not odd
+            if odd:
+                inside.append(i)
+        return inside
+
+    # Include points on grid lines, where rows and columns meet.
+    points = rng.uniform(-5, 60, (300, 2)).tolist()
+    points += (index.origin + index.cell * rng.integers(0, 12, (50, 2))).tolist()
+    for x, y in points:
+        assert index.contains(x, y) == brute_contains(x, y)
+
+
+def test_plane_index_is_invalidated_by_add_shape():
+    plane = Plane("p", Point("o", 0, 0, 0), V3D(0, 0, 1), shapes=[square(0, 0, 1)])
+
+    first = plane.index
+    assert plane.index is first
+    plane.add_shape(square(5, 5, 1))
+    assert plane.index is not first
+    assert plane.index.contains(5.5, 5.5) == [1]
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pytest
+from starlette.exceptions import HTTPException
+
+from daiku.api import create_plane, setup_tables
+from daiku.api import ingest
+from daiku.api.ingest import PART, PLANE, StreamParser
+
+
+class StreamRequest:
+    def __init__(self, body: bytes, chunk: int = 5):
+        self.body = body
+        self.chunk = chunk
+        self.path_params = {}
+
+    async def stream(self):
+        for i in range(0, len(self.body), self.chunk):
+            yield self.body[i:i + self.chunk]
+
+
+def run(func, request):
+    return asyncio.get_event_loop().run_until_complete(func(request))
+
+
+def parse(body, schema=PLANE, chunk=None):
+    parser = StreamParser(schema)
+    chunk = chunk or len(body) or 1
+    for i in range(0, len(body), chunk):
+        parser.feed(body[i:i + chunk])
+    parser.feed(b"", final=True)
+    return parser.result
+
+
+def error(body, schema=PLANE):
+    with pytest.raises(HTTPException) as exc:
+        parse(body, schema)
+    assert exc.value.status_code == 400
+    return exc.value.detail
+
+
+PART_DOC = {
+    "gid": "part",
+    "origin": {"gid": "o", "x": 0, "y": 0, "z": 0},
+    "width": 10,
+    "height": 2.5,
+    "depth": 1e-1,
+    "notes": {"tags": ["a", {"b": None}], "flag": True, "s": "quote \" and } ]"},
+    "planes": [
+        {
+            "gid": "pl",
+            "origin": {"gid": "o", "x": 1, "y": -2},
+            "normal": {"x": 0, "y": 0, "z": 1},
+            "shapes": [
+                [{"x": -0.0, "y": 1.25}, {"y": 2, "x": 3, "z": 9}, {"x": 1.5e-3, "y": -12}],
+                [],
+            ],
+        }
+    ],
+}
+
+
+def test_parse_is_independent_of_chunking():
+    body = json.dumps(PART_DOC, indent=1).encode()
+    results = [parse(body, PART, chunk) for chunk in (1, 2, 3, 7, 64, len(body))]
+    for result in results:
+        assert result["depth"] == 0.1
+        assert "notes" not in result
+        shapes = result["planes"][0]["shapes"]
+        np.testing.assert_array_equal(shapes[0], [[0.0, 1.25], [3.0, 2.0], [0.0015, -12.0]])
+        assert shapes[0].dtype == np.float64
+        assert shapes[1].shape == (0, 2)
+
+
+def test_schema_errors_name_the_field():
+    assert error(b'{"gid": 1}') == "gid: expected a string"
+    assert error(
+        b'{"gid": "a", "shapes": [[{"x": 1, "y": 2}, {"x": 1, "y": "2"}]]}'
+    ) == "shapes[0][1].y: expected a number"
+    assert error(b'{"gid": "a", "shapes": [[{"x": 1}]]}') == "shapes[0][0]: missing field 'y'"
+    assert error(b'{"gid": "a", "normal": {"x": 0, "y": 0}}') == "body: missing field 'origin'"
+    assert error(b'[]') == "body: expected an object"
+
+
+def test_malformed_json_is_rejected():
+    assert error(b'{"gid": "a",') == "body: unexpected end of body"
+    assert error(b'{"gid": "a",}') == "body: unexpected '}'"
+    assert error(b'{"gid": "a", "x": [1,]}') == "x: unexpected ']'"
+    assert error(b'{"gid": "a", "x": 01}') == "x: invalid number '01'"
+    assert "invalid JSON" in error(b'{"gid": @}')
+    assert "unexpected data" in error(
+        b'{"gid": "a", "origin": {"gid": "o", "x": 0, "y": 0}, "normal": {"x": 0, "y": 0}} {}'
+    )
+
+
+def test_strings_split_across_chunks():
+    gid = 'quote " slash \\ \u00e9\u20ac \U0001f600 \n end'
+    doc = {"gid": gid, "skip": "x" * 5000 + "\\", "origin": {"gid": "o", "x": 0, "y": 0},
+           "normal": {"x": 0, "y": 0}}
+    body = json.dumps(doc).encode()
+    for chunk in (1, 2, 3, 5, 1000):
+        assert parse(body, chunk=chunk)["gid"] == gid
+    body = json.dumps(doc, ensure_ascii=False).encode()
+    for chunk in (1, 2, 3, 5, 1000):
+        assert parse(body, chunk=chunk)["gid"] == gid
+
+
+def test_invalid_strings_are_rejected():
+    assert error(b'{"gid": "a\x01b"}').startswith("gid: invalid string")
+    assert error(b'{"gid": "a\\qb"}').startswith("gid: invalid string")
+    assert error(b'{"skip": "a\\x"}').startswith("skip: invalid string")
+    assert error(b'{"a\x02": 1}').startswith("body: invalid string")
+
+
+def test_unfinished_tokens_are_rejected():
+    assert error(b'{"gid": "abc') == "body: unexpected end of body"
+    assert "invalid JSON" in error(b'{"gid": tx}')
+    with pytest.raises(HTTPException) as exc:
+        parse(b'{"x": ' + b"1" * 10000 + b"}", chunk=4096)
+    assert exc.value.detail == "body: number too long"
+
+
+def test_out_of_range_numbers_are_rejected():
+    huge = "1" * 400
+    assert error(b'{"gid": "a", "shapes": [[{"x": 1, "y": 2}, {"x": 1e999, "y": 0}]]}') == (
+        "shapes[0][1]: expected a finite number"
+    )
+    assert error(f'{{"gid": "a", "shapes": [[{{"y": 0, "x": {huge}}}]]}}'.encode()) == (
+        "shapes[0][0].x: expected a finite number"
+    )
+    assert error(b'{"gid": "a", "origin": {"gid": "o", "x": -1e999, "y": 0}}') == (
+        "origin.x: expected a finite number"
+    )
+    assert error(b'{"gid": "p", "width": 1e400}', PART) == "width: expected a finite number"
+
+
+def test_create_plane_reports_bad_payload():
+    setup_tables()
+    body = json.dumps({"gid": "bad", "normal": {"x": 0, "y": 0, "z": 1}}).encode()
+    with pytest.raises(HTTPException) as exc:
+        run(create_plane, StreamRequest(body))
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "body: missing field 'origin'"
+
+
+def test_body_size_limit(monkeypatch):
+    monkeypatch.setattr(ingest, "MAX_BODY_BYTES", 16)
+    body = json.dumps(PART_DOC["planes"][0]).encode()
+    with pytest.raises(HTTPException) as exc:
+        run(create_plane, StreamRequest(body))
+    assert exc.value.status_code == 413
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import signal
+import sys
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+from starlette.exceptions import HTTPException
+
+from daiku.api import jobs
+from daiku.api.jobs import cancel_job, get_job, get_job_result, submit_job
+
+
+class DummyRequest:
+    def __init__(self, data=None, path_params=None, body=None):
+        self._data = data
+        self._body = body
+        self.path_params = path_params or {}
+
+    async def json(self):
+        if self._body is not None:
+            return json.loads(self._body)
+        return self._data
+
+
+def run(func, request):
+    return asyncio.get_event_loop().run_until_complete(func(request))
+
+
+SQUARE = [{"x": 0, "y": 0}, {"x": 2, "y": 0}, {"x": 2, "y": 2}, {"x": 0, "y": 2}]
+
+
+def test_job_runs_in_pool_and_caches_result():
+    payload = {"kind": "shape_metrics", "shapes": [SQUARE, []]}
+    resp = run(submit_job, DummyRequest(payload))
+    assert resp.status_code == 202
+    job_id = json.loads(resp.body)["gid"]
+
+    jobs.jobs[job_id].future.result(timeout=30)
+    status = run(get_job, DummyRequest(path_params={"job_id": job_id}))
+    assert json.loads(status.body)["status"] == "done"
+
+    result = json.loads(run(get_job_result, DummyRequest(path_params={"job_id": job_id})).body)
+    assert result == {"area": [4.0, 0.0], "perimeter": [8.0, 0.0], "bounds": [[0.0, 0.0, 2.0, 2.0], None]}
+
+    again = run(submit_job, DummyRequest(payload))
+    assert json.loads(again.body) == {"gid": job_id, "kind": "shape_metrics", "status": "done"}
+    jobs.shutdown_jobs()
+
+
+def test_unknown_kind_and_cancelled_job(monkeypatch):
+    with pytest.raises(HTTPException) as exc:
+        run(submit_job, DummyRequest({"kind": "nope"}))
+    assert exc.value.status_code == 400
+
+    class IdleExecutor:
+        def submit(self, *args):
+            return Future()
+
+    monkeypatch.setattr(jobs, "executor", IdleExecutor)
+    resp = run(submit_job, DummyRequest({"kind": "shape_metrics", "shapes": [SQUARE[:3]]}))
+    job_id = json.loads(resp.body)["gid"]
+    assert json.loads(resp.body)["status"] == "pending"
+
+    cancelled = run(cancel_job, DummyRequest(path_params={"job_id": job_id}))
+    assert json.loads(cancelled.body)["status"] == "cancelled"
+    with pytest.raises(HTTPException) as exc:
+        run(get_job_result, DummyRequest(path_params={"job_id": job_id}))
+    assert exc.value.status_code == 409
+
+
+@pytest.mark.parametrize("request_", [
+    DummyRequest(body=b"{not json"),
+    DummyRequest(["shape_metrics"]),
+    DummyRequest({"kind": ["shape_metrics"]}),
+    DummyRequest({"kind": "offset", "params": [1]}),
+    DummyRequest({"kind": "offset", "params": {}}),
+    DummyRequest({"kind": "offset", "params": {"distance": float("nan")}}),
+    DummyRequest({"kind": "offset", "params": {"distance": "1"}}),
+    DummyRequest({"kind": "offset", "params": {"distance": 1, "tolerance": 0}}),
+    DummyRequest({"kind": "shape_metrics", "shapes": [[{"x": "abc", "y": 0}]]}),
+    DummyRequest({"kind": "shape_metrics", "shapes": [[{"x": None, "y": 0}]]}),
+    DummyRequest({"kind": "shape_metrics", "shapes": [[{"x": 10 ** 400, "y": 0}]]}),
+    DummyRequest(body=b'{"kind": "shape_metrics", "shapes": [[{"x": NaN, "y": 0}]]}'),
+])
+def test_malformed_submissions_are_rejected(request_):
+    with pytest.raises(HTTPException) as exc:
+        run(submit_job, request_)
+    assert exc.value.status_code == 400
+
+
+def test_offset_job_runs_with_validated_params():
+    payload = {"kind": "offset", "params": {"distance": 1}, "shapes": [SQUARE]}
+    job_id = json.loads(run(submit_job, DummyRequest(payload)).body)["gid"]
+    result = jobs.jobs[job_id].future.result(timeout=30)
+    assert result["source"] == [0]
+    jobs.shutdown_jobs()
+
+
+def test_pool_is_replaced_after_a_worker_dies():
+    payload = {"kind": "shape_metrics", "shapes": [SQUARE]}
+    first = json.loads(run(submit_job, DummyRequest(payload)).body)["gid"]
+    jobs.jobs[first].future.result(timeout=30)
+
+    pool = jobs.executor()
+    for pid in list(pool._processes):
+        os.kill(pid, signal.SIGKILL)
+    # Wait until the pool has noticed and refuses work.
+    with pytest.raises(BrokenProcessPool):
+        for _ in range(100):
+            pool.submit(int).result(timeout=30)
+
+    payload["shapes"].append(SQUARE[:3])
+    resp = run(submit_job, DummyRequest(payload))
+    assert resp.status_code == 202
+    gid = json.loads(resp.body)["gid"]
+    assert jobs.jobs[gid].future.result(timeout=30)["area"] == [4.0, 2.0]
+    assert jobs.executor() is not pool
+    jobs.shutdown_jobs()
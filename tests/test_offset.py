@@ -0,0 +1,120 @@
+import pathlib
+import sys
+
+# Ensure the package root is on the import path when running tests without
+# installing the package.
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import math
+import os
+import time
+
+import numpy as np
+import pytest
+
+from daiku.geo import offset
+from daiku.geo.base import V2D, V3D
+from daiku.geo.offset import offset_packed, offset_shapes
+from daiku.geo.point import Point
+from daiku.geo.shape import pack_shapes, shape_areas
+from daiku.parts import Plane
+
+
+def square(x, y, size):
+    return [V2D(x, y), V2D(x + size, y), V2D(x + size, y + size), V2D(x, y + size)]
+
+
+def areas(rings):
+    return shape_areas(*pack_shapes(rings)).tolist()
+
+
+def test_profile_offset_rounds_convex_corners():
+    rings = offset_shapes([square(0, 0, 10)], 1.0, tolerance=1e-4)[0]
+
+    assert len(rings) == 1
+    # Sides grow by the radius and each corner gains a quarter circle.
+    assert math.isclose(areas(rings)[0], 100 + 40 + math.pi, rel_tol=1e-4)
+    for p in rings[0]:
+        outside = math.hypot(max(0, -p.x, p.x - 10), max(0, -p.y, p.y - 10))
+        assert math.isclose(outside, 1.0, abs_tol=1e-9)
+
+
+def test_pocket_offset_handles_orientation_and_collapse():
+    cw_square = list(reversed(square(0, 0, 10)))
+
+    (ring,) = offset_shapes([cw_square], -1.0)[0]
+    assert sorted((p.x, p.y) for p in ring) == [(1, 1), (1, 9), (9, 1), (9, 9)]
+    assert areas([ring])[0] > 0
+    assert offset_shapes([square(0, 0, 10)], -6.0)[0] == []
+
+
+def test_pocket_splits_at_narrow_neck():
+    dumbbell = [
+        V2D(0, 0), V2D(4, 0), V2D(4, 1.8), V2D(6, 1.8), V2D(6, 0), V2D(10, 0),
+        V2D(10, 4), V2D(6, 4), V2D(6, 2.2), V2D(4, 2.2), V2D(4, 4), V2D(0, 4),
+    ]
+    vertices, offsets = pack_shapes([dumbbell, square(20, 0, 4)])
+
+    out, out_offsets, source = offset_packed(vertices, offsets, -0.5)
+
+    assert source.tolist() == [0, 0, 1]
+    # Each lobe is a 3 x 3 square plus small fillets where the neck was.
+    assert [round(a, 1) for a in shape_areas(out, out_offsets)] == [9.0, 9.0, 9.0]
+
+
+def test_offsets_are_cached_per_shape_and_radius():
+    offset._cache.clear()
+    plane = Plane("p", Point("o", 0, 0, 0), V3D(0, 0, 1), shapes=[square(0, 0, 2), square(0, 0, 2)])
+
+    first = plane.offset_shapes(0.25)
+    assert len(offset._cache) == 1
+    assert first[0] is first[1]
+    assert plane.offset_shapes(0.25)[0] is first[0]
+    plane.offset_shapes(0.25, inward=True)
+    assert len(offset._cache) == 2
+
+
+# Generous enough for slow CI machines; the pairwise cleanup this replaced
+# needed over a minute for 1000 vertices.
+OFFSET_BUDGET = float(os.getenv("DAIKU_OFFSET_BUDGET", "2.0"))
+
+
+def test_large_wavy_shapes_offset_quickly():
+    n = 4000
+    angle = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    radius = 10 + 0.3 * np.sin(angle * 200)
+    vertices = np.stack([radius * np.cos(angle), radius * np.sin(angle)], axis=1)
+    offsets = np.array([0, n])
+
+    for distance in (0.5, -0.5):
+        start = time.perf_counter()
+        out, out_offsets, source = offset_packed(vertices, offsets, distance)
+        assert time.perf_counter() - start < OFFSET_BUDGET
+        # The waves are narrower than the tool, so a single ring is left
+        # that keeps the radius from the shape.
+        assert source.tolist() == [0]
+        ring = out[out_offsets[0]:out_offsets[1]]
+        gap = distance_to(ring, vertices) - abs(distance)
+        # Arc chords may cut up to the tolerance into the true offset.
+        assert gap.min() > -offset.DEFAULT_TOLERANCE and gap.max() < 1e-9
+
+
+def distance_to(points, shape):
+    a = shape
+    d = np.roll(shape, -1, axis=0) - shape
+    best = np.full(len(points), np.inf)
+    for lo in range(0, len(points), 256):
+        rel = points[lo:lo + 256, None] - a[None]
+        t = np.clip(np.einsum("pij,ij->pi", rel, d) / np.einsum("ij,ij->i", d, d), 0, 1)
+        gap = rel - t[..., None] * d[None]
+        best[lo:lo + 256] = np.hypot(gap[..., 0], gap[..., 1]).min(axis=1)
+    return best
+
+
+def test_invalid_distance_or_tolerance_is_rejected():
+    vertices, offsets = pack_shapes([square(0, 0, 4)])
+    for distance, tolerance in ((1.0, 0.0), (1.0, -0.1), (1.0, math.nan), (math.nan, 0.01), (math.inf, 0.01)):
+        with pytest.raises(ValueError):
+            offset_packed(vertices, offsets, distance, tolerance)
+        with pytest.raises(ValueError):
+            offset_shapes([], distance, tolerance)
@@ -0,0 +1,27 @@
+import pathlib
+import sys
+
+# Ensure the package root is on the import path when running tests without
+# installing the package.
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from daiku.geo.base import V2D
+from daiku.geo.shape import pack_shapes, shape_hash, unpack_shapes
+
+
+def test_shape_hash_is_canonical():
+    a = [V2D(0.0, 0.0), V2D(1, 2)]
+    b = [V2D(-0.0, 0.0), V2D(1.0, 2.0)]
+
+    assert shape_hash(a) == shape_hash(b)
+    assert shape_hash(a) != shape_hash(list(reversed(a)))
+
+
+def test_pack_shapes_round_trip():
+    shapes = [[V2D(0, 0), V2D(1, 0), V2D(1, 1)], [], [V2D(5, 6)]]
+
+    vertices, offsets = pack_shapes(shapes)
+
+    assert vertices.shape == (4, 2)
+    assert offsets.tolist() == [0, 3, 3, 4]
+    assert unpack_shapes(vertices, offsets) == shapes
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+# Generous enough for slow CI machines while still catching an eager boto3
+# import, which alone costs several hundred milliseconds.
+IMPORT_BUDGET = float(os.getenv("DAIKU_IMPORT_BUDGET", "0.75"))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import daiku.api
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "elapsed": elapsed,
+    "modules": [m for m in ("boto3", "botocore", "multiprocessing") if m in sys.modules],
+}))
+"""
+
+
+def test_import_stays_within_budget():
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    result = json.loads(out.stdout)
+
+    assert result["modules"] == []
+    assert result["elapsed"] < IMPORT_BUDGET
+
+
+def test_lifespan_runs_setup_and_shutdown():
+    import asyncio
+
+    from daiku.api import app, lifespan
+    from daiku.api import jobs
+
+    async def cycle():
+        async with lifespan(app):
+            jobs.executor()
+        return jobs._executor
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(cycle()) is None
+    finally:
+        loop.close()
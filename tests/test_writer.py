@@ -0,0 +1,122 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest
+
+from daiku.api.writer import WriteBehindBuffer
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_buffer_keeps_last_write_per_gid():
+    batches = []
+    buf = WriteBehindBuffer(batches.append)
+
+    for n in range(5):
+        buf.put("planes", {"gid": "p1", "data": str(n)})
+    buf.put("parts", {"gid": "a", "data": "x"})
+
+    assert len(buf) == 2
+    assert buf.get("planes", "p1")["data"] == "4"
+    buf.flush()
+    assert batches == [{"planes": {"p1": {"gid": "p1", "data": "4"}}, "parts": {"a": {"gid": "a", "data": "x"}}}]
+    assert buf.get("planes", "p1") is None
+
+
+def test_failed_flush_requeues_items():
+    def fail(batch):
+        raise RuntimeError("throttled")
+
+    buf = WriteBehindBuffer(fail)
+    buf.put("planes", {"gid": "p1", "data": "old"})
+    with pytest.raises(RuntimeError):
+        buf.flush()
+    assert buf.get("planes", "p1")["data"] == "old"
+
+
+def test_background_flush_on_threshold_and_stop():
+    batches = []
+    buf = WriteBehindBuffer(batches.append, interval=60, max_items=2)
+
+    async def scenario():
+        await buf.start()
+        buf.put("planes", {"gid": "p1"})
+        buf.put("planes", {"gid": "p2"})
+        for _ in range(100):
+            if batches:
+                break
+            await asyncio.sleep(0.01)
+        assert sorted(batches[0]["planes"]) == ["p1", "p2"]
+        buf.put("planes", {"gid": "p3"})
+        await buf.stop()
+
+    run(scenario())
+    assert [sorted(b["planes"]) for b in batches] == [["p1", "p2"], ["p3"]]
+
+
+def test_stop_waits_for_a_flush_in_progress():
+    started, release = threading.Event(), threading.Event()
+    batches = []
+
+    def write(batch):
+        if not batches:
+            batches.append(None)
+            started.set()
+            release.wait(10)
+            raise RuntimeError("throttled")
+        batches.append(batch)
+
+    buf = WriteBehindBuffer(write, interval=60, max_items=1)
+
+    async def scenario():
+        await buf.start()
+        buf.put("planes", {"gid": "p1"})
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        stopping = asyncio.ensure_future(buf.stop())
+        await asyncio.sleep(0.05)
+        release.set()
+        await stopping
+
+    run(scenario())
+    # The failed write was put back and persisted by the final drain.
+    assert batches[1:] == [{"planes": {"p1": {"gid": "p1"}}}]
+    assert len(buf) == 0
+
+
+def test_failing_flushes_back_off_and_stop_gives_up(caplog):
+    calls = []
+
+    def fail(batch):
+        calls.append(time.monotonic())
+        raise RuntimeError("throttled")
+
+    buf = WriteBehindBuffer(fail, interval=0.01, max_items=1, max_backoff=0.08)
+
+    async def scenario():
+        await buf.start()
+        buf.put("planes", {"gid": "p1"})
+        deadline = time.monotonic() + 10
+        while len(calls) < 4 and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        assert buf.failures >= 3
+        await buf.stop(attempts=2)
+
+    run(scenario())
+    # Retries wait 20, 40 and then 80ms rather than the 10ms flush interval.
+    # A busy machine only ever stretches the gaps.
+    gaps = [b - a for a, b in zip(calls, calls[1:4])]
+    assert all(gap >= 0.9 * wait for gap, wait in zip(gaps, [0.02, 0.04, 0.08]))
+    assert buf.get("planes", "p1") == {"gid": "p1"}
+    assert "Write-behind flush failed" in caplog.text
+    assert "Giving up on 1 buffered writes" in caplog.text